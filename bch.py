@@ -102,27 +102,43 @@ def repair(a,b): # "repair" two bit errors by brute force.
                 return (2,bnum2str)
     return(-1,b)
 
-def nrepair(a,b): # "repair" two bit errors by brute force.
-    r=ndivide(a,b)
+# (poly, blen) -> ({syndrome: error pattern} for one bit errors, same for two bit errors)
+_syndromes={}
+
+def syndrome_tables(poly,blen):
+    # Patterns are entered in the order nrepair used to try them, so the
+    # first pattern for a syndrome is the one the brute force search found.
+    if (poly,blen) not in _syndromes:
+        single={}
+        for b1 in xrange(blen):
+            e1=1<<b1
+            single.setdefault(nndivide(poly,e1),e1)
+        double={}
+        for b1 in xrange(blen):
+            for b2 in xrange(b1+1,blen):
+                e2=(1<<b1)|(1<<b2)
+                double.setdefault(nndivide(poly,e2),e2)
+        _syndromes[(poly,blen)]=(single,double)
+    return _syndromes[(poly,blen)]
+
+def nnrepair(a,num,blen): # like nrepair, num as int of blen bits
+    r=nndivide(a,num)
     if(r==0):
-        return (0,b)
+        return (0,num)
+    (single,double)=syndrome_tables(a,blen)
+    # The remainder is linear: (bits^error)%poly == bits%poly ^ error%poly
+    if r in single:
+        return (1,num^single[r])
+    if r in double:
+        return (2,num^double[r])
+    return(-1,num)
+
+def nrepair(a,b): # "repair" up to two bit errors by looking up the syndrome
     blen=len(b)
-    bnum=int(b,2)
-    for b1 in xrange(len(b)):
-        bnum1=bnum^(1<<b1)
-        r=nndivide(a,bnum1)
-        if(r==0):
-            bnum1str=("{0:0%db}"%blen).format(bnum1)
-            return (1,bnum1str)
-    for b1 in xrange(len(b)):
-        bnum1=bnum^(1<<b1)
-        for b2 in xrange(b1+1,len(b)):
-            bnum2=bnum1^(1<<b2)
-            r=nndivide(a,bnum2)
-            if(r==0):
-                bnum2str=("{0:0%db}"%blen).format(bnum2)
-                return (2,bnum2str)
-    return(-1,b)
+    (errs,num)=nnrepair(a,int(b,2),blen)
+    if errs<=0:
+        return (errs,b)
+    return (errs,("{0:0%db}"%blen).format(num))
 
 def bch_repair(poly,bits):
     (errs,repaired)=nrepair(poly,bits)
@@ -0,0 +1,178 @@
+#!/usr/bin/python
+# vim: set ts=4 sw=4 tw=0 et pm=:
+
+_new = object.__new__
+
+# startswith() arguments given as strings, converted
+_prefixes = {}
+
+# length -> 0101...01, the second bit of every pair
+_pair_masks = {}
+
+def _string(bits):
+    if isinstance(bits, Bits):
+        return str(bits)
+    return bits
+
+class Bits(object):
+    """ Immutable bit vector, length bits held in an int with the first bit
+        as the most significant one.
+
+        Stands in for the '0'/'1' strings frames used to be: len(),
+        indexing and slicing (a single bit is a Bits of length 1), + and
+        comparison with Bits or strings, in, find(), index(), startswith()
+        and count() work the same. int() is the value of the bits, str()
+        renders the string. Anything else, like int(bits, 2), needs str().
+    """
+    __slots__ = ('value', 'length')
+
+    def __init__(self, value=0, length=0):
+        self.value = value
+        self.length = length
+
+    @classmethod
+    def from_string(cls, string):
+        if not string:
+            return cls(0, 0)
+        return cls(int(string, 2), len(string))
+
+    @classmethod
+    def join(cls, parts):
+        """ All parts one after the other """
+        value = 0
+        length = 0
+        for part in parts:
+            value = (value << part.length) | part.value
+            length += part.length
+        return cls(value, length)
+
+    def __len__(self):
+        return self.length
+
+    def __int__(self):
+        return int(self.value) # a plain int if it fits, like int(string, 2)
+
+    def __str__(self):
+        if self.length == 0:
+            return ''
+        return bin(self.value)[2:].zfill(self.length)
+
+    def __repr__(self):
+        return repr(str(self))
+
+    def __reduce__(self):
+        return (Bits, (self.value, self.length))
+
+    def __getitem__(self, key):
+        length = self.length
+        if key.__class__ is slice:
+            start, stop, step = key.indices(length)
+            if step == -1 and key.start is None and key.stop is None:
+                return self.reverse()
+            if step != 1:
+                return Bits.from_string(str(self)[key])
+            bits = _new(Bits)
+            if stop <= start:
+                bits.value = 0
+                bits.length = 0
+            else:
+                bits.value = (self.value >> (length - stop)) & ((1 << (stop - start)) - 1)
+                bits.length = stop - start
+            return bits
+        if key < 0:
+            key += length
+        if key < 0 or key >= length:
+            raise IndexError("bit index out of range")
+        bits = _new(Bits)
+        bits.value = (self.value >> (length - 1 - key)) & 1
+        bits.length = 1
+        return bits
+
+    def __add__(self, other):
+        if isinstance(other, basestring):
+            other = Bits.from_string(other)
+        elif not isinstance(other, Bits):
+            return NotImplemented
+        return Bits((self.value << other.length) | other.value, self.length + other.length)
+
+    def __eq__(self, other):
+        if isinstance(other, Bits):
+            return self.length == other.length and self.value == other.value
+        if isinstance(other, basestring):
+            return str(self) == other
+        return NotImplemented
+
+    def __ne__(self, other):
+        result = self.__eq__(other)
+        if result is NotImplemented:
+            return result
+        return not result
+
+    def __hash__(self):
+        return hash((self.value, self.length))
+
+    def uint(self, start, stop):
+        """ Value of the bits [start:stop] (start and stop not negative) """
+        if stop > self.length:
+            stop = self.length
+        if stop <= start:
+            return 0
+        return int((self.value >> (self.length - stop)) & ((1 << (stop - start)) - 1))
+
+    def split(self, n):
+        """ Pieces of n bits, the last one shorter if n does not divide the length """
+        value = self.value
+        length = self.length
+        rest = length % n
+        mask = (1 << n) - 1
+        pieces = [Bits((value >> shift) & mask, n) for shift in xrange(length - n, rest - 1, -n)]
+        if rest:
+            pieces.append(Bits(value & ((1 << rest) - 1), rest))
+        return pieces
+
+    def swap_pairs(self):
+        """ The bits with both bits of every pair swapped, an odd last bit is dropped """
+        value = self.value
+        length = self.length
+        if length % 2:
+            value >>= 1
+            length -= 1
+        if length not in _pair_masks:
+            _pair_masks[length] = int('01' * (length // 2) or '0', 2)
+        mask = _pair_masks[length]
+        return Bits(((value >> 1) & mask) | ((value & mask) << 1), length)
+
+    def reverse(self):
+        """ The bits in reverse order """
+        value = self.value
+        if not value:
+            return Bits(0, self.length)
+        return Bits(int(bin(value)[:1:-1], 2) << (self.length - value.bit_length()), self.length)
+
+    def __contains__(self, sub):
+        """ sub (Bits or string) is a part of the bits """
+        return _string(sub) in str(self)
+
+    def find(self, sub, start=None, end=None):
+        """ Position of the first sub in bits[start:end], -1 if there is none """
+        return str(self).find(_string(sub), start, end)
+
+    def index(self, sub, start=None, end=None):
+        """ Like find(), but raises ValueError if there is no sub """
+        return str(self).index(_string(sub), start, end)
+
+    def startswith(self, prefix):
+        if isinstance(prefix, basestring):
+            if prefix not in _prefixes:
+                _prefixes[prefix] = Bits.from_string(prefix)
+            prefix = _prefixes[prefix]
+        return prefix.length <= self.length and self.value >> (self.length - prefix.length) == prefix.value
+
+    def count(self, bit):
+        """ Number of '1' or '0' bits """
+        ones = bin(self.value).count('1')
+        if bit == '1':
+            return ones
+        if bit == '0':
+            return self.length - ones
+        raise ValueError("can only count '0' or '1'")
@@ -0,0 +1,73 @@
+# vim: set ts=4 sw=4 tw=0 et pm=:
+import os.path
+import re
+import numpy
+
+# One record per burst, offset and length in samples of the data file
+INDEX_DTYPE = numpy.dtype([('time', '<f8'), ('freq', '<f8'), ('offset', '<i8'), ('length', '<i8')])
+
+def names(file_name):
+    """ (data file, index file) of the container file_name (NAME, NAME.bursts or NAME.index) """
+    basename = re.sub('\.(bursts|index)$', '', file_name)
+    return basename + ".bursts", basename + ".index"
+
+def is_container(file_name):
+    return file_name.endswith(".bursts") or file_name.endswith(".index")
+
+class BurstFileWriter(object):
+    """ Writes bursts into one container instead of a file per burst.
+
+        The samples of all bursts (complex64) are appended to NAME.bursts,
+        a record of (time stamp, frequency, offset, length) per burst to
+        NAME.index. The index entry is written after the samples, so a
+        container being written can be read at any time.
+    """
+    def __init__(self, file_name):
+        data_name, index_name = names(file_name)
+        self._data = open(data_name, "wb")
+        self._index = open(index_name, "wb")
+        self._offset = 0
+
+    def add(self, time_stamp, freq, signal):
+        signal = numpy.asarray(signal, dtype=numpy.complex64)
+        signal.tofile(self._data)
+        self._data.flush()
+        numpy.array([(time_stamp, freq, self._offset, len(signal))], dtype=INDEX_DTYPE).tofile(self._index)
+        self._index.flush()
+        self._offset += len(signal)
+
+    def close(self):
+        self._data.close()
+        self._index.close()
+
+class BurstFile(object):
+    """ Read access to a container, bursts are views of the memory mapped data file.
+
+        A partly written index record at the end (the writer was stopped
+        while writing it) is left out. Raises ValueError if the index
+        points outside of the data file.
+    """
+    def __init__(self, file_name):
+        data_name, index_name = names(file_name)
+        self.index = numpy.fromfile(index_name, dtype=INDEX_DTYPE)
+        if os.path.getsize(data_name) > 0:
+            self._data = numpy.memmap(data_name, dtype=numpy.complex64, mode='r')
+        else:
+            self._data = numpy.zeros(0, dtype=numpy.complex64)
+
+        offset, length = self.index['offset'], self.index['length']
+        bad = (offset < 0) | (length < 0) | (offset + length > len(self._data))
+        if bad.any():
+            raise ValueError("%s: burst %d is not in %s" % (index_name, numpy.flatnonzero(bad)[0], data_name))
+
+    def __len__(self):
+        return len(self.index)
+
+    def __getitem__(self, i):
+        """ (time stamp, frequency, signal) of burst i """
+        time_stamp, freq, offset, length = self.index[i]
+        return time_stamp, freq, self._data[offset:offset+length]
+
+    def __iter__(self):
+        for i in xrange(len(self)):
+            yield self[i]
@@ -0,0 +1,83 @@
+# vim: set ts=4 sw=4 tw=0 et pm=:
+
+# Bursts of two neighbouring chunks closer than this are the same burst
+DUPLICATE_MS = 5
+DUPLICATE_HZ = 10000
+
+def split(nblocks, chunk_len):
+    """ (start, stop) block numbers of chunks of chunk_len blocks covering nblocks """
+    if chunk_len < 1:
+        raise Exception("Chunk length must be at least one block")
+    return [(start, min(start + chunk_len, nblocks)) for start in xrange(0, nblocks, chunk_len)]
+
+class OverlapFilter(object):
+    """ Joins the bursts of neighbouring chunks.
+
+        Each chunk is detected from a lead-in before it up to a number of
+        blocks after it (the overrun), noting the detector state before the
+        first and last overrun blocks. At the first block where the previous
+        chunk and the next one are in the same state, the bursts found before
+        it are taken from the previous chunk, the ones after from the next.
+        That gives the same bursts as reading the whole file. Should the
+        states not meet (the exp noise floor never does), each chunk keeps
+        the bursts found inside it, and the ones the next chunk reports again
+        less than max_dt and max_df apart at the border are dropped.
+
+        Chunks have to be passed in order.
+    """
+    def __init__(self, block_duration, max_dt=DUPLICATE_MS, max_df=DUPLICATE_HZ):
+        self._block_duration = block_duration
+        self._max_dt = max_dt
+        self._max_df = max_df
+        self._overrun = [] # bursts the previous chunk found after its end
+        self._states = {} # block number -> state of the previous chunk after its end
+        self._tail = [] # (time stamp, frequency) near the end of the previous chunk
+        self._end = None
+        self.duplicates = 0
+        self.inexact = 0 # borders where the states did not meet
+
+    def _duplicate(self, time_stamp, freq):
+        for t, f in self._tail:
+            if abs(time_stamp - t) <= self._max_dt and abs(freq - f) <= self._max_df:
+                return True
+        return False
+
+    def _handover(self, stop, states):
+        for block in sorted(self._states):
+            if block >= stop:
+                break
+            if states.get(block) == self._states[block]:
+                return block
+        return None
+
+    def chunk(self, start, stop, bursts, states):
+        """ bursts of the chunk from block start to stop as (block, time stamp,
+            frequency, ...) tuples, including those found in the lead-in and
+            overrun, states its detector states by block number. Returns the
+            bursts which belong to the chunk. """
+        end = stop * self._block_duration
+        if self._end is None:
+            handover = start
+        else:
+            handover = self._handover(stop, states)
+
+        if handover is not None:
+            new = [burst for burst in self._overrun if burst[0] < handover]
+            new += [burst for burst in bursts if handover <= burst[0] < stop]
+        else:
+            self.inexact += 1
+            new = []
+            for burst in bursts:
+                if not start <= burst[0] < stop:
+                    continue
+                time_stamp, freq = burst[1:3]
+                if time_stamp < self._end + self._max_dt and self._duplicate(time_stamp, freq):
+                    self.duplicates += 1
+                    continue
+                new.append(burst)
+
+        self._overrun = [burst for burst in bursts if burst[0] >= stop]
+        self._states = dict((block, state) for block, state in states.items() if block >= stop)
+        self._tail = [burst[1:3] for burst in new if burst[1] >= end - self._max_dt]
+        self._end = end
+        return new
@@ -8,30 +8,97 @@ import filters
 #import matplotlib.pyplot as plt
 import scipy.optimize
 import scipy.signal
+import scipy.fftpack
 import iridium
+import nco
+import metrics
 
 F_SEARCH = 100
+F_COARSE_STEP = 9 # Grid for the coarse pass of the 'coarse' frequency search, hits both ends of the range
+F_TERMS = 12 # Terms of the power series correlate_shifted expands a frequency shift into
+
+# How estimate_sync_word_freq finds the frequency offset
+FREQ_SEARCHES = ('fminbound', 'full', 'coarse')
 
 def normalize(v):
     m = max(v)
     return [x/m for x in v]
 
+class SyncWordBank(object):
+    """ Matched filters for one sync word at all frequency offsets.
+
+        Only the unshifted sync word is kept, bank[offset] shifts it by
+        offset Hz on demand.
+    """
+    def __init__(self, sync_word, sample_rate):
+        self._sync_word = sync_word
+        self._sample_rate = sample_rate
+        self._unshifted = numpy.conjugate(sync_word[::-1])
+        self._spectra = {} # nfft -> fft of the unshifted sync word
+        self._term_spectra = {} # nfft -> ffts of the power series terms
+
+    def __len__(self):
+        return len(self._sync_word)
+
+    def spectrum(self, nfft):
+        """ FFT of the unshifted matched filter, zero padded to nfft """
+        if nfft not in self._spectra:
+            if len(self._spectra) > 100:
+                self._spectra.clear()
+            self._spectra[nfft] = scipy.fftpack.fft(self._unshifted, nfft)
+        return self._spectra[nfft]
+
+    @property
+    def half_len(self):
+        """ Distance of the ends of the sync word from its middle in samples """
+        return (len(self._sync_word) - 1) / 2.
+
+    def term_spectra(self, nfft):
+        """ FFTs of the unshifted matched filter times ((n - middle) / half_len)**p
+            for the powers p < F_TERMS, one row each, zero padded to nfft """
+        if nfft not in self._term_spectra:
+            if len(self._term_spectra) > 100:
+                self._term_spectra.clear()
+            u = (numpy.arange(len(self._unshifted)) - self.half_len) / self.half_len
+            terms = self._unshifted * u ** numpy.arange(F_TERMS)[:, numpy.newaxis]
+            self._term_spectra[nfft] = scipy.fftpack.fft(terms, nfft, axis=1)
+        return self._term_spectra[nfft]
+
+    def __getitem__(self, offset):
+        if offset == 0:
+            return self._unshifted
+        sync_word_shifted = nco.Oscillator(-offset, self._sample_rate).mix(self._sync_word)
+        return numpy.conjugate(sync_word_shifted[::-1])
+
+class SignalSpectrum(object):
+    """ FFT of a signal, zero padded to a fast length which fits
+        correlations with templates of up to template_len samples. """
+    def __init__(self, signal, template_len):
+        self.signal_len = len(signal)
+        self.nfft = scipy.fftpack.helper.next_fast_len(len(signal) + template_len - 1)
+        self.fft = scipy.fftpack.fft(signal, self.nfft)
+
 class ComplexSyncSearch(object):
 
-    def __init__(self, sample_rate, verbose=False):
+    def __init__(self, sample_rate, verbose=False, freq_search='fminbound'):
+        if freq_search not in FREQ_SEARCHES:
+            raise Exception("Unknown frequency search: %s" % freq_search)
+        self._freq_search = freq_search
         self._sample_rate = sample_rate
         self._samples_per_symbol = self._sample_rate / iridium.SYMBOLS_PER_SECOND
 
         self._sync_words = [{},{}]
-        self._sync_words[iridium.DOWNLINK][0] = self.generate_padded_sync_words(-F_SEARCH, F_SEARCH, 0, iridium.DOWNLINK)
-        self._sync_words[iridium.DOWNLINK][16] = self.generate_padded_sync_words(-F_SEARCH, F_SEARCH, 16, iridium.DOWNLINK)
-        self._sync_words[iridium.DOWNLINK][64] = self.generate_padded_sync_words(-F_SEARCH, F_SEARCH, 64, iridium.DOWNLINK)
+        self._sync_words[iridium.DOWNLINK][0] = self.generate_sync_word_bank(0, iridium.DOWNLINK)
+        self._sync_words[iridium.DOWNLINK][16] = self.generate_sync_word_bank(16, iridium.DOWNLINK)
+        self._sync_words[iridium.DOWNLINK][64] = self.generate_sync_word_bank(64, iridium.DOWNLINK)
+
+        self._sync_words[iridium.UPLINK][16] = self.generate_sync_word_bank(16, iridium.UPLINK)
 
-        self._sync_words[iridium.UPLINK][16] = self.generate_padded_sync_words(-F_SEARCH, F_SEARCH, 16, iridium.UPLINK)
+        self._max_sync_word_len = max(len(bank) for banks in self._sync_words for bank in banks.values())
 
         self._verbose = verbose
 
-    def generate_padded_sync_words(self, f_min, f_max, preamble_length, direction):
+    def generate_sync_word_bank(self, preamble_length, direction):
         s1 = -1-1j
         s0 = -s1
 
@@ -49,20 +116,34 @@ class ComplexSyncSearch(object):
         filter = filters.rrcosfilter(161, 0.4, 1./iridium.SYMBOLS_PER_SECOND, self._sample_rate)[1]
         sync_word_padded_filtered = numpy.convolve(sync_word_padded, filter, 'full')
 
-        sync_words_shifted = {}
+        return SyncWordBank(sync_word_padded_filtered, self._sample_rate)
 
-        for offset in range(f_min, f_max):
-            shift_signal = numpy.exp(complex(0,-1)*numpy.arange(len(sync_word_padded_filtered))*2*numpy.pi*offset/float(self._sample_rate))
-            sync_words_shifted[offset] = sync_word_padded_filtered * shift_signal
-            sync_words_shifted[offset] = numpy.conjugate(sync_words_shifted[offset][::-1])
-        
-        return sync_words_shifted
 
+    def signal_spectrum(self, signal):
+        """ Spectrum of signal to share between several correlate_spectrum calls """
+        return SignalSpectrum(signal, self._max_sync_word_len)
+
+    def correlate_spectrum(self, spectrum, sync_words):
+        """ The signal behind spectrum correlated with the unshifted sync word of
+            each bank in sync_words. Same layout as estimate_sync_word ('same' mode). """
+        results = []
+        for bank in sync_words:
+            if spectrum.nfft < spectrum.signal_len + len(bank) - 1:
+                raise Exception("Signal spectrum too short for sync word")
+            c = scipy.fftpack.ifft(spectrum.fft * bank.spectrum(spectrum.nfft), overwrite_x=True)
+            start = (len(bank) - 1) // 2
+            results.append(c[start:start+spectrum.signal_len])
+        return results
+
+    @metrics.timed('sync_search')
+    def estimate_sync_word_start(self, signal, direction, spectrum=None):
+        if spectrum is None:
+            spectrum = self.signal_spectrum(signal)
+
+        c = numpy.abs(self.correlate_spectrum(spectrum, [self._sync_words[direction][16]])[0])
+        sync_middle = numpy.argmax(c)
+        confidence = c[sync_middle]
 
-    def estimate_sync_word_start(self, signal, direction):
-        
-        sync_middle, confidence, _ = self.estimate_sync_word(signal, self._sync_words[direction][16][0])
-        
         # Compensate for the 16 symbols of preamble
         sync_start = sync_middle + 2 * self._samples_per_symbol 
 
@@ -75,6 +156,71 @@ class ComplexSyncSearch(object):
         return sync_middle, numpy.abs(c[sync_middle]), numpy.angle(c[sync_middle])
 
 
+    def correlate_shifted(self, signal, sync_words, offsets):
+        """ |signal correlated with sync_words[offset]| for all offsets at once.
+            Returns one row per offset, laid out like estimate_sync_word ('same' mode). """
+        nfft = scipy.fftpack.helper.next_fast_len(len(signal) + len(sync_words) - 1)
+
+        # Shifting the matched filter by f multiplies sample n with
+        # exp(-2j*pi*f*n/fs). Up to a constant phase that is the power series
+        # of exp(-1j*w*u) in u = (n - middle) / half_len, with w = 2*pi*f*half_len/fs
+        # at most about 1 for the search range. So the signal is correlated
+        # once with each term and the offsets are sums of the terms.
+        terms = sync_words.term_spectra(nfft) * scipy.fftpack.fft(signal, nfft)
+        terms = scipy.fftpack.ifft(terms, axis=1, overwrite_x=True)
+        start = (len(sync_words) - 1) // 2
+        terms = terms[:, start:start+len(signal)]
+
+        w = 2 * numpy.pi * numpy.asarray(offsets, dtype=numpy.float64) * sync_words.half_len / self._sample_rate
+        p = numpy.arange(F_TERMS)
+        factorials = numpy.cumprod(numpy.maximum(p, 1))
+        coefficients = (-1j * w[:, numpy.newaxis]) ** p / factorials
+
+        # Real and imaginary part in one real matrix product, which is a lot
+        # faster than a complex one followed by numpy.abs
+        c = numpy.vstack((numpy.hstack((coefficients.real, -coefficients.imag)),
+                          numpy.hstack((coefficients.imag, coefficients.real))))
+        c = c.dot(numpy.vstack((terms.real, terms.imag)))
+        re, im = c[:len(w)], c[len(w):]
+        re *= re
+        im *= im
+        re += im
+        return numpy.sqrt(re)
+
+    def estimate_sync_word_time_freq(self, signal, sync_words, offsets):
+        """ Returns (sync_middle, offset, magnitude) of the strongest correlation over all offsets """
+        c = self.correlate_shifted(signal, sync_words, offsets)
+        row, sync_middle = numpy.unravel_index(numpy.argmax(c), c.shape)
+        return sync_middle, offsets[row], c[row, sync_middle]
+
+    def _best_offset(self, signal, sync_words, offsets):
+        """ The offset with the strongest correlation which is a peak inside
+            offsets. If the correlation only grows towards an end, the offset
+            next to that end. """
+        m = self.correlate_shifted(signal, sync_words, offsets).max(axis=1)
+        inner = m[1:-1]
+        peaks = numpy.flatnonzero((inner >= m[:-2]) & (inner >= m[2:])) + 1
+        if len(peaks) == 0:
+            peaks = [1, len(m) - 2]
+        return offsets[peaks[numpy.argmax(m[peaks])]]
+
+    def _search_freq(self, signal, sync_words):
+        # The strongest correlation of all is often at an end of the range,
+        # with the preamble matching a few symbols early or late, while the
+        # sync word itself is a smaller peak inside. Ends are not used.
+        offsets = numpy.arange(-(F_SEARCH - 1), F_SEARCH)
+        if self._freq_search == 'coarse':
+            freq = self._best_offset(signal, sync_words, offsets[::F_COARSE_STEP])
+            # Refine between the neighbouring grid points, which are the ends
+            # of the refined offsets and so never picked themselves
+            low = max(freq - F_COARSE_STEP, offsets[0])
+            high = min(freq + F_COARSE_STEP, offsets[-1])
+            freq = self._best_offset(signal, sync_words, offsets[low - offsets[0]:high - offsets[0] + 1])
+        else:
+            freq = self._best_offset(signal, sync_words, offsets)
+        return int(freq)
+
+    @metrics.timed('sync_search')
     def estimate_sync_word_freq(self, signal, preamble_length, direction):
 
         if preamble_length not in self._sync_words[direction]:
@@ -117,9 +263,12 @@ class ComplexSyncSearch(object):
             c = scipy.signal.fftconvolve(signal, preambles[int(freq+0.5)], 'same')
             return -numpy.max(numpy.abs(c))
 
-        freq = int(scipy.optimize.fminbound(f_est, -(F_SEARCH - 1), (F_SEARCH - 1), args = (sync_words,), xtol=1) + 0.5)
+        if self._freq_search == 'fminbound':
+            freq = int(scipy.optimize.fminbound(f_est, -(F_SEARCH - 1), (F_SEARCH - 1), args = (sync_words,), xtol=1) + 0.5)
+        else:
+            freq = self._search_freq(signal, sync_words)
         if self._verbose:
-            print "best freq (optimize):", freq
+            print "best freq (%s):" % self._freq_search, freq
 
         if self._verbose:
             freq = numpy.argmax(cs) - F_SEARCH
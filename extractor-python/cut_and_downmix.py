@@ -14,6 +14,9 @@ import scipy.signal
 import complex_sync_search
 import time
 import iridium
+import nco
+import metrics
+import burst_file
 
 #import matplotlib.pyplot as plt
 
@@ -26,7 +29,7 @@ class DownmixError(Exception):
 
 class CutAndDownmix(object):
     def __init__(self, center, input_sample_rate, search_depth=7e-3, search_window=50e3,
-                    symbols_per_second=25000, verbose=False):
+                    symbols_per_second=25000, verbose=False, freq_search='fminbound'):
 
         self._center = center
         self._input_sample_rate = int(input_sample_rate)
@@ -44,10 +47,12 @@ class CutAndDownmix(object):
         #self._verbose = True
 
         self._input_low_pass = scipy.signal.firwin(401, float(search_window)/self._input_sample_rate)
+        self._input_low_pass_shifted = {} # search_offset -> low pass taps moved to that frequency
         self._low_pass2= scipy.signal.firwin(401, 10e3/self._output_sample_rate)
         self._rrc = filters.rrcosfilter(51, 0.4, 1./self._symbols_per_second, self._output_sample_rate)[1]
 
-        self._sync_search = complex_sync_search.ComplexSyncSearch(self._output_sample_rate, verbose=self._verbose)
+        self._sync_search = complex_sync_search.ComplexSyncSearch(self._output_sample_rate, verbose=self._verbose,
+                                                                        freq_search=freq_search)
 
         self._pre_start_samples = int(0.1e-3 * self._output_sample_rate)
 
@@ -71,6 +76,38 @@ class CutAndDownmix(object):
 
         return (fft_result, fft_freq)
 
+    def _shifted_low_pass(self, offset):
+        if offset not in self._input_low_pass_shifted:
+            if len(self._input_low_pass_shifted) > 1000:
+                self._input_low_pass_shifted.clear()
+            taps = nco.Oscillator(offset, self._input_sample_rate).mix(self._input_low_pass)
+            self._input_low_pass_shifted[offset] = taps
+        return self._input_low_pass_shifted[offset]
+
+    def _downmix_decimate(self, signal, offset):
+        # Shift by -offset, filter with the input low pass ('same' mode) and keep every _decimation'th sample
+        if self._decimation < 5:
+            # fftconvolve over all samples is cheaper for small decimation factors
+            signal = nco.Oscillator(-offset, self._input_sample_rate).mix(signal)
+            signal = scipy.signal.fftconvolve(signal, self._input_low_pass, mode='same')
+            return signal[::self._decimation]
+
+        # Only compute the kept samples: The filter is moved to offset instead of
+        # the signal, run as a polyphase decimator and only the output is mixed down.
+        taps = self._shifted_low_pass(offset)
+        delay = (len(taps) - 1) // 2
+        pad = -delay % self._decimation
+        start = (delay + pad) // self._decimation
+        length = (len(signal) + self._decimation - 1) // self._decimation
+
+        if pad:
+            signal = numpy.concatenate((numpy.zeros(pad, dtype=signal.dtype), signal))
+        signal = scipy.signal.upfirdn(taps, signal, down=self._decimation)[start:start+length]
+
+        # Output sample m is sample m*_decimation+delay of the full convolution
+        phase = -2*numpy.pi*offset*delay/float(self._input_sample_rate)
+        return nco.Oscillator(-offset, self._output_sample_rate, phase=phase).mix(signal)
+
     def _signal_start(self, signal, frequency_offset=None):
         signal_mag = numpy.abs(signal)
         signal_mag_lp = scipy.signal.fftconvolve(signal_mag, self._low_pass2, mode='same')
@@ -84,28 +121,17 @@ class CutAndDownmix(object):
         #plt.show()
         return start
 
+    @metrics.timed('cut_and_downmix')
     def cut_and_downmix(self, signal, search_offset=None, direction=None, frequency_offset=0, phase_offset=0):
         if self._verbose:
             iq.write("/tmp/signal.cfile", signal)
 
-        #t0 = time.time()
-        shift_signal = numpy.exp(complex(0,-1)*numpy.arange(len(signal))*2*numpy.pi*search_offset/float(self._input_sample_rate))
-        #print "t_shift_signal:", time.time() - t0
-
-        #t0 = time.time()
-        signal = signal * shift_signal
-        #print "t_shift1:", time.time() - t0
-
-        #t0 = time.time()
-        signal = scipy.signal.fftconvolve(signal, self._input_low_pass, mode='same')
-        #print "t_filter:", time.time() - t0
+        t0 = metrics.start()
+        signal = self._downmix_decimate(signal, search_offset)
+        metrics.stop('cut_and_downmix.downmix_decimate', t0)
 
-        #t0 = time.time()
+        t0 = metrics.start()
         signal_center = self._center + search_offset
-        if self._verbose:
-            iq.write("/tmp/signal-shifted-filtered.cfile", signal)
-
-        signal = signal[::self._decimation]
         if self._verbose:
             iq.write("/tmp/signal-filtered-deci.cfile", signal)
 
@@ -123,9 +149,9 @@ class CutAndDownmix(object):
 
         #signal_mag = [abs(x) for x in signal]
         #plt.plot(normalize(signal_mag))
-        #print "t_misc:", time.time() - t0
+        metrics.stop('cut_and_downmix.misc', t0)
 
-        #t0 = time.time()
+        t0 = metrics.start()
         begin = self._signal_start(signal[:int(self._search_depth * self._output_sample_rate)])
         signal = signal[begin:]
 
@@ -134,9 +160,9 @@ class CutAndDownmix(object):
             iq.write("/tmp/signal-filtered-deci-cut-start.cfile", signal)
             iq.write("/tmp/signal-filtered-deci-cut-start-x2.cfile", signal ** 2)
 
-        #print "t_signal_start:", time.time() - t0
+        metrics.stop('cut_and_downmix.signal_start', t0)
 
-        #t0 = time.time()
+        t0 = metrics.start()
         signal_preamble = signal[:fft_length] ** 2
 
         #plt.plot([begin+skip, begin+skip], [0, 1], 'r')
@@ -183,19 +209,16 @@ class CutAndDownmix(object):
             print 'FFT interpolated peak:', max_index - correction
             print 'FFT interpolated peak (Hz):', offset_freq
 
-        #print "t_fft:", time.time() - t0
+        metrics.stop('cut_and_downmix.fft', t0)
 
-        #t0 = time.time()
-        # Generate a complex signal at offset_freq Hz.
-        shift_signal = numpy.exp(complex(0,-1)*numpy.arange(len(signal))*2*numpy.pi*offset_freq/float(self._output_sample_rate))
-
-        # Multiply the two signals, effectively shifting signal by offset_freq
-        signal = signal*shift_signal
+        t0 = metrics.start()
+        # Multiply with a complex signal at -offset_freq Hz, effectively shifting signal by offset_freq
+        signal = nco.Oscillator(-offset_freq, self._output_sample_rate).mix(signal)
         if self._verbose:
             iq.write("/tmp/signal-filtered-deci-cut-start-shift.cfile", signal)
-        #print "t_shift2:", time.time() - t0
+        metrics.stop('cut_and_downmix.shift2', t0)
 
-        #t0 = time.time()
+        t0 = metrics.start()
         preamble_uw = signal[:(preamble_length + 16) * self._output_samples_per_symbol]
 
         if direction is not None:
@@ -220,18 +243,17 @@ class CutAndDownmix(object):
 
         phase += phase_offset
         offset += frequency_offset
-        #print "t_css:", time.time() - t0
+        metrics.stop('cut_and_downmix.css', t0)
 
-        #t0 = time.time()
-        shift_signal = numpy.exp(complex(0,-1)*numpy.arange(len(signal))*2*numpy.pi*offset/float(self._output_sample_rate))
-        signal = signal*shift_signal
+        t0 = metrics.start()
+        signal = nco.Oscillator(-offset, self._output_sample_rate).mix(signal)
         offset_freq += offset
 
         if self._verbose:
             iq.write("/tmp/signal-filtered-deci-cut-start-shift-shift.cfile", signal)
-        #print "t_shift3:", time.time() - t0
+        metrics.stop('cut_and_downmix.shift3', t0)
 
-        #t0 = time.time()
+        t0 = metrics.start()
         #plt.plot([cmath.phase(x) for x in signal[:fft_length]])
 
         # Multiplying with a complex number on the unit circle
@@ -244,7 +266,7 @@ class CutAndDownmix(object):
 
         signal = scipy.signal.fftconvolve(signal, self._rrc, 'same')
 
-        #print "t_rrc:", time.time() - t0
+        metrics.stop('cut_and_downmix.rrc', t0)
         #plt.plot([x.real for x in signal])
         #plt.plot([x.imag for x in signal])
 
@@ -260,6 +282,13 @@ class CutAndDownmix(object):
 
         return (signal, signal_center+offset_freq, direction)
 
+    def shift(self, signal, frequency_offset):
+        """ Moves a signal returned by cut_and_downmix() by frequency_offset, like
+            passing frequency_offset to cut_and_downmix() without cutting the
+            burst again. The signal has already been filtered, which makes no
+            difference for offsets of a few Hz. """
+        return nco.Oscillator(-frequency_offset, self._output_sample_rate).mix(signal)
+
 if __name__ == "__main__":
 
     options, remainder = getopt.getopt(sys.argv[1:], 'o:w:c:r:s:f:v:p:', ['search-offset=',
@@ -271,7 +300,9 @@ if __name__ == "__main__":
                                                             'frequency-offset=',
                                                             'phase-offset=',
                                                             'uplink',
-                                                            'downlink'
+                                                            'downlink',
+                                                            'freq-search=',
+                                                            'timing',
                                                             ])
     center = None
     sample_rate = None
@@ -283,6 +314,7 @@ if __name__ == "__main__":
     frequency_offset = 0
     phase_offset = 0
     direction = None
+    freq_search = 'fminbound'
 
     for opt, arg in options:
         if opt in ('-o', '--search-offset'):
@@ -305,6 +337,10 @@ if __name__ == "__main__":
             direction = iridium.UPLINK
         elif opt == '--downlink':
             direction = iridium.DOWNLINK
+        elif opt == '--freq-search':
+            freq_search = arg
+        elif opt == '--timing':
+            metrics.recorder = metrics.Metrics()
 
     if sample_rate == None:
         print >> sys.stderr, "Sample rate missing!"
@@ -320,12 +356,30 @@ if __name__ == "__main__":
         file_name = remainder[0]
         basename= filename= re.sub('\.[^.]*$','',file_name)
 
-    signal = iq.read(file_name)
-
     cad = CutAndDownmix(center=center, input_sample_rate=sample_rate, symbols_per_second=symbols_per_second,
-                            search_depth=search_depth, verbose=verbose, search_window=search_window)
+                            search_depth=search_depth, verbose=verbose, search_window=search_window,
+                            freq_search=freq_search)
+
+    if burst_file.is_container(file_name):
+        # Cut all bursts of the container (e.g. from detector.py --bursts) into a new one
+        out_name = "%s-cut.bursts" % os.path.basename(basename)
+        writer = burst_file.BurstFileWriter(out_name)
+        for time_stamp, offset, signal in burst_file.BurstFile(file_name):
+            try:
+                signal, freq, _ = cad.cut_and_downmix(signal=signal, search_offset=offset if search_offset is None else search_offset,
+                                        direction=direction, frequency_offset=frequency_offset, phase_offset=phase_offset)
+            except DownmixError:
+                continue
+            writer.add(time_stamp, freq, signal)
+        writer.close()
+        print "output=",out_name
+    else:
+        signal = iq.read(file_name)
+
+        signal, freq, _ = cad.cut_and_downmix(signal=signal, search_offset=search_offset, direction=direction, frequency_offset=frequency_offset, phase_offset=phase_offset)
 
-    signal, freq, _ = cad.cut_and_downmix(signal=signal, search_offset=search_offset, direction=direction, frequency_offset=frequency_offset, phase_offset=phase_offset)
+        iq.write("%s-f%010d.cut" % (os.path.basename(basename), freq), signal)
+        print "output=","%s-f%10d.cut" % (os.path.basename(basename), freq)
 
-    iq.write("%s-f%010d.cut" % (os.path.basename(basename), freq), signal)
-    print "output=","%s-f%10d.cut" % (os.path.basename(basename), freq)
+    if metrics.recorder is not None:
+        print >> sys.stderr, metrics.recorder.summary()
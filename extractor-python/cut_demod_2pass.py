@@ -9,9 +9,11 @@ import cmath
 import filters
 import re
 import iq
+import burst_file
 import getopt
 import demod
 import cut_and_downmix
+import iridium
 
 if __name__ == "__main__":
 
@@ -29,7 +31,6 @@ if __name__ == "__main__":
     center = None
     sample_rate = None
     symbols_per_second = 25000
-    preamble_length = 16
     search_offset = None
     search_window = 50000
     search_depth = 0.007
@@ -52,9 +53,9 @@ if __name__ == "__main__":
             use_correlation=True
         elif opt in ('-v', '--verbose'):
             verbose = True
-        elif opt in ('-u', '--uplink'):
+        elif opt == '--uplink':
             direction = iridium.UPLINK
-        elif opt in ('-d', '--downlink'):
+        elif opt == '--downlink':
             direction = iridium.DOWNLINK
 
 
@@ -72,19 +73,31 @@ if __name__ == "__main__":
         file_name = remainder[0]
         basename= filename= re.sub('\.[^.]*$','',file_name)
 
-    signal = iq.read(file_name)
-
-    cad = cut_and_downmix.CutAndDownmix(center=center, sample_rate=sample_rate, symbols_per_second=symbols_per_second, preamble_length=preamble_length,
+    cad = cut_and_downmix.CutAndDownmix(center=center, input_sample_rate=sample_rate, symbols_per_second=symbols_per_second,
                             search_depth=search_depth, verbose=verbose, search_window=search_window)
-    d = demod.Demod(sample_rate=sample_rate, verbose=verbose)
+    d = demod.Demod(sample_rate=cad.output_sample_rate, verbose=verbose)
 
-    temp_signal, freq, _ = cad.cut_and_downmix(signal=signal, search_offset=search_offset, direction=direction)
+    container = burst_file.is_container(file_name)
+    if container:
+        # All bursts of the container (e.g. from detector.py --bursts) in this process
+        bursts = [(time_stamp, offset if search_offset is None else search_offset, signal)
+                    for time_stamp, offset, signal in burst_file.BurstFile(file_name)]
+    else:
+        bursts = [(0, search_offset, iq.read(file_name))]
 
-    dataarray, data, access_ok, lead_out_ok, confidence, level, nsymbols, final_offset = d.demod(temp_signal,return_final_offset=True)
+    for time_stamp, offset, signal in bursts:
+        try:
+            temp_signal, freq, burst_direction = cad.cut_and_downmix(signal=signal, search_offset=offset, direction=direction)
+        except cut_and_downmix.DownmixError:
+            if not container:
+                raise
+            continue
 
-    print "RAW: %s %d %010d A:%s L:%s %3d%% %.3f %3d %s"%(basename,0,freq,("no","OK")[access_ok],("no","OK")[lead_out_ok],confidence,level,(nsymbols-12),data)
-    signal, freq, _ = cad.cut_and_downmix(signal=signal, search_offset=search_offset, frequency_offset=-final_offset)
-    print "F_off:",-final_offset
-    dataarray, data, access_ok, lead_out_ok, confidence, level, nsymbols, final_offset = d.demod(signal,return_final_offset=True)
-    print "RAW: %s %d %010d A:%s L:%s %3d%% %.3f %3d %s"%(basename,0,freq,("no","OK")[access_ok],("no","OK")[lead_out_ok],confidence,level,(nsymbols-12),data)
+        dataarray, data, access_ok, lead_out_ok, confidence, level, nsymbols, final_offset = d.demod(temp_signal, burst_direction, return_final_offset=True)
 
+        print "RAW: %s %d %010d A:%s L:%s %3d%% %.3f %3d %s"%(basename,time_stamp,freq,("no","OK")[access_ok],("no","OK")[lead_out_ok],confidence,level,(nsymbols-12),data)
+        # Cut again from the full rate signal, extractor.py --refine shifts temp_signal instead
+        signal, freq, _ = cad.cut_and_downmix(signal=signal, search_offset=offset, direction=burst_direction, frequency_offset=-final_offset)
+        print "F_off:",-final_offset
+        dataarray, data, access_ok, lead_out_ok, confidence, level, nsymbols, final_offset = d.demod(signal, burst_direction, return_final_offset=True)
+        print "RAW: %s %d %010d A:%s L:%s %3d%% %.3f %3d %s"%(basename,time_stamp,freq,("no","OK")[access_ok],("no","OK")[lead_out_ok],confidence,level,(nsymbols-12),data)
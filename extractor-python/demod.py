@@ -13,10 +13,18 @@ import complex_sync_search
 import iq
 import getopt
 import iridium
+import metrics
+import burst_file
 
 
 UW_DOWNLINK = "022220002002"
 UW_UPLINK = "220002002022"
+LEAD_OUT = "100101111010110110110011001111"
+
+# Gray coded bit pair for each difference (mod 4) between consecutive symbols
+GRAY_BITS = numpy.array([[0,0], [1,0], [1,1], [0,1]], dtype=numpy.uint8)
+
+SLICE_WINDOW = 64 # Symbols the vectorized slicer precomputes at once
 
 def normalize(v):
     m = max([abs(x) for x in v])
@@ -31,10 +39,12 @@ def mynormalize(v):
     return zip
 
 class Demod(object):
-    def __init__(self, sample_rate, verbose=False, debug=False):
+    def __init__(self, sample_rate, verbose=False, debug=False, vectorized=True):
         self._sample_rate=sample_rate
         self._verbose=verbose
         self._debug = debug
+        # The per symbol messages and debug output need the step by step slicer
+        self._vectorized = vectorized and not verbose and not debug
         
         if self._verbose:
             print "sample rate:",self._sample_rate
@@ -71,8 +81,10 @@ class Demod(object):
         if direction is not None:
             start, _ = self._sync_search.estimate_sync_word_start(signal, direction)
         else:
-            start_dl, confidence_dl = self._sync_search.estimate_sync_word_start(signal, iridium.DOWNLINK)
-            start_ul, confidence_ul = self._sync_search.estimate_sync_word_start(signal, iridium.UPLINK)
+            # Both directions share one FFT of the signal
+            spectrum = self._sync_search.signal_spectrum(signal)
+            start_dl, confidence_dl = self._sync_search.estimate_sync_word_start(signal, iridium.DOWNLINK, spectrum)
+            start_ul, confidence_ul = self._sync_search.estimate_sync_word_start(signal, iridium.UPLINK, spectrum)
             
             if confidence_dl > confidence_ul:
                 start = start_dl
@@ -83,6 +95,113 @@ class Demod(object):
             print "correlated start of sync word", start
         return start
 
+    def _timing_steps(self, signal, start, stop, sdiff):
+        """ For every sample position in [start, stop), how far the slicer moves when it
+            lands there: -sdiff if sampled late, +sdiff if sampled early, 0 otherwise.
+            start must be at least samples_per_symbol. """
+        sps = self._samples_per_symbol
+        end = min(stop, len(signal) - sps) # the step by step slicer hits an IndexError from here on
+        step = numpy.zeros(stop - start, dtype=numpy.int64)
+        if end <= start:
+            return step
+
+        # One column for the real part, one for the imaginary part
+        parts = numpy.column_stack((signal.real[start-sps:end+sps], signal.imag[start-sps:end+sps]))
+        cur = parts[sps:-sps]
+        pre = parts[:-2*sps]
+        post = parts[2*sps:]
+        curpre = parts[sps-sdiff:-sps-sdiff]
+        curpost = parts[sps+sdiff:len(parts)-sps+sdiff]
+
+        rising = (pre < 0) & (post < 0) & (cur > 0)
+        falling = (pre > 0) & (post > 0) & (cur < 0)
+        desc = (curpre > cur) & (cur > curpost)
+        asc = (curpre < cur) & (cur < curpost)
+        early = ((rising & asc) | (falling & desc)).astype(numpy.int64)
+        late = ((rising & desc) | (falling & asc)).astype(numpy.int64)
+
+        # The imaginary part is only checked if the real part shows no transition
+        column = numpy.where(rising[:, 0] | falling[:, 0], 0, 1)
+        rows = numpy.arange(end - start)
+        step[:end-start] = (early[rows, column] - late[rows, column]) * sdiff
+        return step
+
+    def _slice_window(self, signal, i, lmax, sdiff):
+        """ Timing steps, sample phases and squelch flags for the next SLICE_WINDOW symbols from position i.
+            Returns the first position covered, the position the window ends and the three lists. """
+        base = i - sdiff # lowest position the slicer can reach from i
+        end = min(len(signal), i + SLICE_WINDOW * self._samples_per_symbol)
+        stop = min(len(signal), end + sdiff)
+
+        steps = self._timing_steps(signal, base, stop, sdiff).tolist()
+        part = signal[base:stop]
+        angles = (numpy.angle(part.astype(numpy.complex128))/math.pi*180).tolist()
+        # float64 holds every float32 magnitude exactly, so this compares like abs(signal[i]) < lmax/8
+        squelch = (numpy.abs(part).astype(numpy.float64) < float(lmax/8)).tolist()
+        return base, end, steps, angles, squelch
+
+    def _slice_symbols(self, signal, i, lmax, sdiff, alpha):
+        """ Same symbols and final phase as the step by step slicer in demod. Sample phases,
+            timing decisions and squelch are precomputed with numpy, one window at a time. """
+        n = len(signal)
+        # i advances by at least samples_per_symbol - sdiff per symbol
+        symbols = [0] * ((n - i) // (self._samples_per_symbol - sdiff) + 1)
+        nsymbols = 0
+        phase = 0
+
+        base, end, steps, angles, squelch = self._slice_window(signal, i, lmax, sdiff)
+        while True:
+            i += steps[i - base]
+
+            sym_phase = (angles[i - base] + phase) % 360
+            offset = 45 - (sym_phase % 90)
+            if abs(offset) > 22:
+                self._errors += 1
+            if offset > alpha:
+                phase += sdiff
+            if offset < -alpha:
+                phase -= sdiff
+
+            symbols[nsymbols] = int(sym_phase)/90
+            nsymbols += 1
+
+            i += self._samples_per_symbol
+            if i >= n:
+                break
+            if i >= end:
+                base, end, steps, angles, squelch = self._slice_window(signal, i, lmax, sdiff)
+            if squelch[i - base]:
+                break
+
+        self._nsymbols += nsymbols
+        return symbols[:nsymbols], phase
+
+    def _format_data(self, data, access_ok, lead_out_ok):
+        """ The bit string as printed on RAW lines: unique word in <>, lead out in []
+            and a space after each full group of 32 bits between the markers """
+        uw_end = min(iridium.UW_LENGTH*2, len(data)) if access_ok else 0
+        lead_out_index = data.find(LEAD_OUT, uw_end) if lead_out_ok else -1
+
+        runs = [] # (text before, start, end) of each run of bits
+        if access_ok:
+            runs.append(("<", 0, uw_end))
+        if lead_out_index >= 0:
+            runs.append(("> " if access_ok else "", uw_end, lead_out_index))
+            runs.append(("[", lead_out_index, lead_out_index+len(LEAD_OUT)))
+            runs.append(("]", lead_out_index+len(LEAD_OUT), len(data)))
+        else:
+            runs.append(("> " if access_ok else "", uw_end, len(data)))
+
+        parts = []
+        for text, start, end in runs:
+            parts.append(text)
+            for group in xrange(start, end - 31, 32):
+                parts.append(data[group:group+32])
+                parts.append(" ")
+            parts.append(data[start + (end-start)//32*32:end])
+        return "".join(parts)
+
+    @metrics.timed('demod')
     def demod(self, signal, direction=None, return_final_offset=False):
         self._errors=0
         self._nsymbols=0
@@ -119,46 +238,21 @@ class Demod(object):
         if(self._samples_per_symbol<20):
             sdiff=1
 
-        while True:
-            if self._debug:
-                self.peaks[i]=complex(-lmax,lmax/10.)
-
-            # Adjust our sample rate to reality
-            try:
-                cur=signal[i].real
-                pre=signal[i-self._samples_per_symbol].real
-                post=signal[i+self._samples_per_symbol].real
-                curpre=signal[i-sdiff].real
-                curpost=signal[i+sdiff].real
-
-                if pre<0 and post<0 and cur>0:
-                    if curpre>cur and cur>curpost:
-                        if self._verbose:
-                            print "Sampled late"
-                        i-=sdiff
-                        delay-=sdiff
-                    if curpre<cur and cur<curpost:
-                        if self._verbose:
-                            print "Sampled early"
-                        i+=sdiff
-                        delay-=sdiff
-                elif pre>0 and post>0 and cur<0:
-                    if curpre>cur and cur>curpost:
-                        if self._verbose:
-                            print "Sampled early"
-                        i+=sdiff
-                        delay+=sdiff
-                    if curpre<cur and cur<curpost:
-                        if self._verbose:
-                            print "Sampled late"
-                        i-=sdiff
-                        delay-=sdiff
-                else:
-                    cur=signal[i].imag
-                    pre=signal[i-self._samples_per_symbol].imag
-                    post=signal[i+self._samples_per_symbol].imag
-                    curpre=signal[i-sdiff].imag
-                    curpost=signal[i+sdiff].imag
+        t0 = metrics.start()
+        if self._vectorized and i >= self._samples_per_symbol + sdiff and i < len(signal):
+            symbols, phase = self._slice_symbols(signal, i, lmax, sdiff, alpha)
+        else:
+            while True:
+                if self._debug:
+                    self.peaks[i]=complex(-lmax,lmax/10.)
+
+                # Adjust our sample rate to reality
+                try:
+                    cur=signal[i].real
+                    pre=signal[i-self._samples_per_symbol].real
+                    post=signal[i+self._samples_per_symbol].real
+                    curpre=signal[i-sdiff].real
+                    curpost=signal[i+sdiff].real
 
                     if pre<0 and post<0 and cur>0:
                         if curpre>cur and cur>curpost:
@@ -170,7 +264,7 @@ class Demod(object):
                             if self._verbose:
                                 print "Sampled early"
                             i+=sdiff
-                            delay+=sdiff
+                            delay-=sdiff
                     elif pre>0 and post>0 and cur<0:
                         if curpre>cur and cur>curpost:
                             if self._verbose:
@@ -182,76 +276,89 @@ class Demod(object):
                                 print "Sampled late"
                             i-=sdiff
                             delay-=sdiff
-            except IndexError:
-                if self._verbose:
-                    print "Last sample"
-
-            lvl= abs(signal[i])/level
-            ang= cmath.phase(signal[i])/math.pi*180
-            symbol,offset = self.qpsk(ang+phase)
-            if(offset>alpha):
+                    else:
+                        cur=signal[i].imag
+                        pre=signal[i-self._samples_per_symbol].imag
+                        post=signal[i+self._samples_per_symbol].imag
+                        curpre=signal[i-sdiff].imag
+                        curpost=signal[i+sdiff].imag
+
+                        if pre<0 and post<0 and cur>0:
+                            if curpre>cur and cur>curpost:
+                                if self._verbose:
+                                    print "Sampled late"
+                                i-=sdiff
+                                delay-=sdiff
+                            if curpre<cur and cur<curpost:
+                                if self._verbose:
+                                    print "Sampled early"
+                                i+=sdiff
+                                delay+=sdiff
+                        elif pre>0 and post>0 and cur<0:
+                            if curpre>cur and cur>curpost:
+                                if self._verbose:
+                                    print "Sampled early"
+                                i+=sdiff
+                                delay+=sdiff
+                            if curpre<cur and cur<curpost:
+                                if self._verbose:
+                                    print "Sampled late"
+                                i-=sdiff
+                                delay-=sdiff
+                except IndexError:
+                    if self._verbose:
+                        print "Last sample"
+
+                lvl= abs(signal[i])/level
+                ang= cmath.phase(signal[i])/math.pi*180
+                symbol,offset = self.qpsk(ang+phase)
+                if(offset>alpha):
+                    if self._debug:
+                        try:
+                            self.peaks[i+self._samples_per_symbol/10]=complex(-lmax*0.8,0);
+                        except IndexError:
+                            if self._verbose:
+                                print "Last sample"
+                    if self._verbose:
+                        print "offset forward"
+                    phase+=sdiff
+                if(offset<-alpha):
+                    if self._debug:
+                        self.peaks[i-self._samples_per_symbol/10]=complex(-lmax*0.8,0);
+                    if self._verbose:
+                        print "offset backward"
+                    phase-=sdiff
+
+                symbols=symbols+[symbol]
                 if self._debug:
-                    try:
-                        self.peaks[i+self._samples_per_symbol/10]=complex(-lmax*0.8,0);
-                    except IndexError:
-                        if self._verbose:
-                            print "Last sample"
+                    self.samples=self.samples+[signal[i]]
+
                 if self._verbose:
-                    print "offset forward"
-                phase+=sdiff
-            if(offset<-alpha):
+                    print "Symbol @%06d (%3d°,%3.0f%%)=%d delay=%d phase=%d"%(i,ang%360,lvl*100,symbol,delay,phase)
                 if self._debug:
-                    self.peaks[i-self._samples_per_symbol/10]=complex(-lmax*0.8,0);
-                if self._verbose:
-                    print "offset backward"
-                phase-=sdiff
+                    self.peaks[i]=complex(+lmax,mapping[symbol]*lmax/5.)
+                    self.turned_signal[i:i+self._samples_per_symbol] = signal[i:i+self._samples_per_symbol] * cmath.rect(1,numpy.radians(phase))
+                i+=self._samples_per_symbol
+                if i>=len(signal) : break
+                if abs(signal[i]) < lmax/8:
+                    break
 
-            symbols=symbols+[symbol]
-            if self._debug:
-                self.samples=self.samples+[signal[i]]
-
-            if self._verbose:
-                print "Symbol @%06d (%3d°,%3.0f%%)=%d delay=%d phase=%d"%(i,ang%360,lvl*100,symbol,delay,phase)
-            if self._debug:
-                self.peaks[i]=complex(+lmax,mapping[symbol]*lmax/5.)
-                self.turned_signal[i:i+self._samples_per_symbol] = signal[i:i+self._samples_per_symbol] * cmath.rect(1,numpy.radians(phase))
-            i+=self._samples_per_symbol
-            if i>=len(signal) : break
-            if abs(signal[i]) < lmax/8:
-                break
+        metrics.stop('demod.slice', t0)
 
         if self._verbose:
             print "Done."
 
-        access=""
-        for s in symbols[:iridium.UW_LENGTH]:
-            access+=str(s)
+        t0 = metrics.start()
+        symbols = numpy.array(symbols, dtype=numpy.int8)
+        access = (symbols[:iridium.UW_LENGTH] + ord('0')).tostring()
 
         # Do gray code on symbols
-        data=""
-        oldsym=0
-        dataarray=[]
-        for s in symbols:
-            bits=(s-oldsym)%4
-            if bits==0:
-                bits=0
-            elif bits==1:
-                bits=2
-            elif bits==2:
-                bits=3
-            else:
-                bits=1
-            oldsym=s
-            data+=str((bits&2)/2)+str(bits&1)
-            dataarray+=[(bits&2)/2,bits&1]
-
-        if access == UW_DOWNLINK or access == UW_UPLINK:
-            access_ok = True
-        else:
-            access_ok = False
+        bits = GRAY_BITS[numpy.diff(numpy.concatenate(([0], symbols))) % 4].reshape(-1)
+        dataarray = bits.tolist()
+        data = (bits + ord('0')).tostring()
 
-        lead_out = "100101111010110110110011001111"
-        lead_out_ok = lead_out in data
+        access_ok = access == UW_DOWNLINK or access == UW_UPLINK
+        lead_out_ok = LEAD_OUT in data
 
         confidence = (1-float(self._errors)/self._nsymbols)*100
 
@@ -267,14 +374,8 @@ class Demod(object):
             print "final phase",phase
             print "frequency offset:", self._real_freq_offset
 
-        if access_ok:
-            data="<"+data[:iridium.UW_LENGTH*2]+"> "+data[iridium.UW_LENGTH*2:]
-
-        if lead_out_ok:
-            lead_out_index = data.find(lead_out)
-            data=data[:lead_out_index]+"["+data[lead_out_index:lead_out_index+len(lead_out)]+"]"  +data[lead_out_index+len(lead_out):]
-
-        data=re.sub(r'([01]{32})',r'\1 ',data)
+        data = self._format_data(data, access_ok, lead_out_ok)
+        metrics.stop('demod.decode', t0)
 
         if return_final_offset:
             return (dataarray, data, access_ok, lead_out_ok, confidence, level, self._nsymbols,self._real_freq_offset)
@@ -287,7 +388,8 @@ if __name__ == "__main__":
                                                             'debug',
                                                             'verbose',
                                                             'uplink',
-                                                            'downlink'
+                                                            'downlink',
+                                                            'timing',
                                                             ])
 
     sample_rate = None
@@ -306,6 +408,8 @@ if __name__ == "__main__":
             direction = iridium.DOWNLINK
         elif opt == '--uplink':
             direction = iridium.UPLINK
+        elif opt == '--timing':
+            metrics.recorder = metrics.Metrics()
 
     if sample_rate == None:
         print >> sys.stderr, "Sample rate missing!"
@@ -317,29 +421,40 @@ if __name__ == "__main__":
     if verbose:
         print "File:",basename
 
-    signal = iq.read(file_name)
-
-    # Nice output format
-    p=re.compile('(.*?)-(\d+)(?:-o[-+]\d+)?-f(\d+)')
-    m=p.match(basename)
-    if(m):
-        rawfile=m.group(1)
-        timestamp=int(m.group(2))
-        freq=int(m.group(3))
+    container = burst_file.is_container(file_name)
+    if container:
+        # All bursts of the container (e.g. from cut_and_downmix.py) in this process
+        bursts = burst_file.BurstFile(file_name)
+        rawfile = re.sub('-cut$', '', basename)
     else:
-        rawfile=basename
-        timestamp=0
-        freq=0
-
-    if verbose:
-        print "raw filename:",rawfile
-        print "base freq:",freq
+        signal = iq.read(file_name)
+
+        # Nice output format
+        p=re.compile('(.*?)-(\d+)(?:-o[-+]\d+)?-f(\d+)')
+        m=p.match(basename)
+        if(m):
+            rawfile=m.group(1)
+            timestamp=int(m.group(2))
+            freq=int(m.group(3))
+        else:
+            rawfile=basename
+            timestamp=0
+            freq=0
+        bursts = [(timestamp, freq, signal)]
 
     d = Demod(sample_rate=sample_rate, verbose=verbose, debug=debug)
 
-    dataarray, data, access_ok, lead_out_ok, confidence, level, nsymbols = d.demod(signal, direction)
+    for timestamp, freq, signal in bursts:
+        if verbose:
+            print "raw filename:",rawfile
+            print "base freq:",freq
+
+        dataarray, data, access_ok, lead_out_ok, confidence, level, nsymbols = d.demod(signal, direction)
+
+        print "RAW: %s %07d %010d A:%s L:%s %3d%% %.3f %3d %s"%(rawfile,timestamp,freq,("no","OK")[access_ok],("no","OK")[lead_out_ok],confidence,level,(nsymbols-iridium.UW_LENGTH),data)
 
-    print "RAW: %s %07d %010d A:%s L:%s %3d%% %.3f %3d %s"%(rawfile,timestamp,freq,("no","OK")[access_ok],("no","OK")[lead_out_ok],confidence,level,(nsymbols-iridium.UW_LENGTH),data)
+    if metrics.recorder is not None:
+        print >> sys.stderr, metrics.recorder.summary()
 
     if 0: # Create r / phi file
         with open("%s.rphi" % (os.path.basename(basename)), 'wb') as out:
@@ -349,7 +464,7 @@ if __name__ == "__main__":
             s = "<" + len(signal) * 'f'
             out.write(struct.Struct(s).pack(*signal))
 
-    if debug: # The graphical debugging file
+    if debug and not container: # The graphical debugging file
         iq.write("%s.peaks" % (os.path.basename(basename)), d.peaks)
         iq.write("%s.turned" % (os.path.basename(basename)), d.turned_signal)
 
@@ -2,15 +2,137 @@
 # vim: set ts=4 sw=4 tw=0 et pm=:
 import sys
 import math
+import hashlib
 import numpy
 import os.path
 import re
 import getopt
 import time
 from functools import partial
+import samples
+import metrics
+import burst_file
+
+class SliceHistory(object):
+    """ Fixed size ring buffer holding the last few fft-sized slices """
+    def __init__(self, nslices, slice_len):
+        self._slices = numpy.zeros((nslices, slice_len), dtype=numpy.complex64)
+        self._pos = 0
+        self._count = 0
+
+    def __len__(self):
+        return self._count * self._slices.shape[1]
+
+    def append(self, slice):
+        self._slices[self._pos] = slice
+        self._pos = (self._pos + 1) % len(self._slices)
+        if self._count < len(self._slices):
+            self._count += 1
+
+    def copy_to(self, out):
+        # Oldest slice first
+        if self._count < len(self._slices):
+            order = self._slices[:self._count]
+        else:
+            order = numpy.concatenate((self._slices[self._pos:], self._slices[:self._pos]))
+        out[:len(self)] = order.reshape(-1)
+
+class BurstBuffer(object):
+    """ Preallocated capture buffer for one burst, grows only if the burst
+        is longer than expected """
+    def __init__(self, capacity):
+        self._buf = numpy.empty(capacity, dtype=numpy.complex64)
+        self._len = 0
+
+    def _reserve(self, length):
+        if length > len(self._buf):
+            buf = numpy.empty(max(length, 2 * len(self._buf)), dtype=numpy.complex64)
+            buf[:self._len] = self._buf[:self._len]
+            self._buf = buf
+
+    def extend(self, history):
+        self._reserve(self._len + len(history))
+        history.copy_to(self._buf[self._len:])
+        self._len += len(history)
+
+    def append(self, slice):
+        self._reserve(self._len + len(slice))
+        self._buf[self._len:self._len + len(slice)] = slice
+        self._len += len(slice)
+
+    @property
+    def signal(self):
+        return self._buf[:self._len]
+
+class MovingAverage(object):
+    """ Noise floor as the mean over the last histlen spectra, kept as a
+        running sum over a fixed ring of spectra. The spectra are rounded to
+        a grid on which adding and removing them is exact for samples up to
+        magnitude 1, so the sum only depends on the spectra in the ring and
+        not on the ones before. """
+    def __init__(self, histlen, fft_size):
+        self._hist = numpy.zeros((histlen, fft_size))
+        self._blocks = numpy.zeros(histlen, dtype=numpy.int64) # block number of each spectrum
+        self._sum = numpy.zeros(fft_size)
+        self._pos = 0
+        self._count = 0
+        # A spectrum bin is less than 2 * fft_size, the sum needs 53 bits at most
+        self._grid = 2. ** (53 - math.ceil(math.log(2 * histlen * fft_size, 2)))
+
+    def __len__(self):
+        return self._count
+
+    def add(self, fft_result, index):
+        fft_result = numpy.round(fft_result * self._grid) / self._grid
+        self._sum += fft_result
+        if self._count == len(self._hist):
+            self._sum -= self._hist[self._pos]
+        else:
+            self._count += 1
+        self._hist[self._pos] = fft_result
+        self._blocks[self._pos] = index
+        self._pos = (self._pos + 1) % len(self._hist)
+
+    def ratio(self, fft_result):
+        return (fft_result / self._sum) * self._count
+
+    def state(self):
+        """ Everything the future noise floor depends on, as a string """
+        order = [(self._pos - self._count + i) % len(self._hist) for i in xrange(self._count)]
+        return self._sum.tostring() + self._blocks[order].tostring()
+
+class ExponentialAverage(object):
+    """ Noise floor as an exponential average with a time constant of
+        histlen spectra. Needs no history. """
+    def __init__(self, histlen, fft_size):
+        self._histlen = histlen
+        self._avg = numpy.zeros(fft_size)
+        self._count = 0
+
+    def __len__(self):
+        return self._count
+
+    def add(self, fft_result, index):
+        self._count += 1
+        # Plain mean until we have seen histlen spectra
+        alpha = 1. / min(self._count, self._histlen)
+        self._avg *= 1 - alpha
+        self._avg += alpha * fft_result
+
+    def ratio(self, fft_result):
+        return fft_result / self._avg
+
+    def state(self):
+        """ Everything the future noise floor depends on, as a string """
+        return self._avg.tostring() + repr(self._count)
+
+NOISE_FLOORS = {
+    'moving': MovingAverage,
+    'exp': ExponentialAverage,
+}
 
 class Detector(object):
-    def __init__(self, sample_rate, fft_peak=7.0, sample_format=None, search_size=1, verbose=False, signal_width=40e3, burst_size=6):
+    def __init__(self, sample_rate, fft_peak=7.0, sample_format=None, search_size=1, verbose=False, signal_width=40e3, burst_size=6, noise_floor='moving', use_mmap=False):
         self._sample_rate = sample_rate
         self._fft_size=int(math.pow(2, 1+int(math.log(self._sample_rate/1000,2)))) # fft is approx 1ms long
         self._bin_size = float(self._fft_size)/self._sample_rate * 1000 # How many ms is one fft now?
@@ -18,47 +140,120 @@ class Detector(object):
         self._search_size = search_size
         self._fft_peak = fft_peak
         self._burst_size = burst_size
+        self._use_mmap = use_mmap # Memory map the input file instead of reading it
 
-        if sample_format == "rtl":
-            self._struct_elem = numpy.uint8
-            self._struct_len = numpy.dtype(self._struct_elem).itemsize * self._fft_size *2
-        elif sample_format == "hackrf":
-            self._struct_elem = numpy.int8
-            self._struct_len = numpy.dtype(self._struct_elem).itemsize * self._fft_size *2
-        elif sample_format == "sc16":
-            self._struct_elem = numpy.int16
-            self._struct_len = numpy.dtype(self._struct_elem).itemsize * self._fft_size *2
-        elif sample_format == "float":
-            self._struct_elem = numpy.complex64
-            self._struct_len = numpy.dtype(self._struct_elem).itemsize * self._fft_size
-        else:
+        if sample_format is None:
             raise Exception("No sample format given")
+        self._converter = samples.SampleConverter(sample_format)
+        self._struct_elem = self._converter.element
+        self._struct_len = numpy.dtype(self._struct_elem).itemsize * self._fft_size
+        if self._struct_elem != numpy.complex64:
+            self._struct_len *= 2
 
         self._window = numpy.blackman(self._fft_size)
         self._fft_histlen=500 # How many items to keep for moving average. 5 times our signal length
+        if noise_floor not in NOISE_FLOORS:
+            raise Exception("Unknown noise floor estimator: %s" % noise_floor)
+        self._noise_floor = NOISE_FLOORS[noise_floor]
         self._data_histlen=self._search_size
         self._data_postlen=8
         self._signal_maxlen=1+int(30/self._bin_size) # ~ 30 ms
+        # Room for history, maximum signal length and the trailing blocks
+        self._burst_capacity=(self._data_histlen+self._signal_maxlen+self._search_size+self._data_postlen)*self._fft_size
         self._fft_freq = numpy.fft.fftshift(numpy.fft.fftfreq(self._fft_size))
         self._signal_width=signal_width/(self._sample_rate/self._fft_size) # Area to ignore around an already found signal in Hz
         
         if self._verbose:
             print "fft_size=%d (=> %f ms)"%(self._fft_size,self._bin_size)
             print "calculate fft once every %d block(s)"%(self._search_size)
+            print "noise floor: %s"%(noise_floor)
             print "require %.1f dB"%(10*math.log(self._fft_peak,10))
             print "signal_width: %d (= %.1f Hz)"%(self._signal_width,self._signal_width*self._sample_rate/self._fft_size)
 
-    def process_file(self, file_name, data_collector):
-        data_hist = []
-        fft_avg = [0.0]*self._fft_size
-        fft_hist = []
+    @property
+    def burst_capacity(self):
+        """ Number of samples a burst usually fits in """
+        return self._burst_capacity
+
+    def _fft(self, slice):
+        return numpy.absolute(numpy.fft.fftshift(numpy.fft.fft(slice * self._window)))
+
+    def _transform_blocks(self, raw_blocks, start):
+        # Yields (slice, fft) per raw block, the first one being block number
+        # start. Blocks which are not searched get the last searched slice and
+        # no fft.
+        index = start - 1
+        out = numpy.empty(self._fft_size, dtype=numpy.complex64)
+        slice = numpy.zeros(self._fft_size, dtype=numpy.complex64)
+        for raw in raw_blocks:
+            index+=1
+            if index%self._search_size==0:
+                slice = self._converter.convert(raw, out)
+                yield slice, self._fft(slice)
+            else:
+                yield slice, None
+
+    def _read_blocks(self, f):
+        # Raw blocks read from f
+        while True:
+            data = f.read(self._struct_len)
+            if not data: break
+            if len(data) != self._struct_len: break
+            yield numpy.frombuffer(data, dtype=self._struct_elem)
+
+    def _read_mapped(self, f, start):
+        # Raw blocks from block number start on as views of the memory mapped f
+        raw = numpy.memmap(f, dtype=self._struct_elem, mode='r')
+        block_len = self._struct_len // raw.itemsize
+        nblocks = len(raw) // block_len
+        raw = raw[:nblocks*block_len].reshape(nblocks, block_len)
+        for index in xrange(start, nblocks):
+            yield raw[index]
+
+    def file_blocks(self, file_name):
+        """ Number of complete blocks in file_name """
+        return os.path.getsize(file_name) // self._struct_len
 
-        index = -1
+    @property
+    def block_duration(self):
+        """ Length of one block in ms, the unit of the time stamps """
+        return self._bin_size
+
+    @property
+    def history_blocks(self):
+        """ Number of blocks the noise floor is averaged over """
+        return self._fft_histlen * self._search_size
+
+    def process_file(self, file_name, data_collector, start=0, stop=None, overrun=0, state_collector=None):
+        """ Passes the bursts found in file_name to data_collector.
+
+            With start and stop only bursts detected in the blocks from start
+            up to stop (plus overrun blocks) are passed on, bursts in progress
+            at the end are read to their end. Reading begins early enough for
+            the noise floor to settle, but only the same state as when reading
+            the whole file gives the same bursts. To find where that is,
+            state_collector(index, state) gets a fingerprint of the detector
+            state before each of the first and last overrun blocks. From a
+            block with the same state on, two runs find the same bursts.
+        """
+        # Twice the noise floor history, starting on a searched block
+        first = max(0, start - 2 * self.history_blocks)
+        first -= first % self._search_size
+        data_hist = SliceHistory(self._data_histlen, self._fft_size)
+        noise_floor = self._noise_floor(self._fft_histlen, self._fft_size)
+
+        index = first - 1
         wf=None
         writepost=0
         signals=0
 
         peaks=[] # idx, postlen, file
+        end = None if stop is None else stop + overrun
+
+        def state():
+            return hashlib.md5(noise_floor.state() +
+                               repr([(p[0], p[1], p[2], p[3], len(p[4].signal)) for p in peaks]) +
+                               repr((burst_signals, burst_mute, len(data_hist)))).hexdigest()
 
         def remove_signal(peaks,idx): # clear "area" around a peak
             w=int(self._signal_width-1)/2
@@ -71,36 +266,28 @@ class Detector(object):
             peaks[p0:p1+1]=[0]*(p1-p0+1)
 
         with open(file_name, "rb") as f:
+            if self._use_mmap:
+                raw_blocks = self._read_mapped(f, first)
+            else:
+                f.seek(first * self._struct_len)
+                raw_blocks = self._read_blocks(f)
+            blocks = self._transform_blocks(raw_blocks, first)
             burst_signals=0
             burst_mute=0
-            while True:
-                data = f.read(self._struct_len)
+            t_block = metrics.start()
+            for block, fft_result in blocks:
                 if burst_signals>0:
                     burst_signals-=1
                 if burst_mute>0:
                     burst_mute-=1
-                if not data: break
-                if len(data) != self._struct_len: break
 
                 index+=1
-                if index%self._search_size==0:
-                    slice = numpy.frombuffer(data, dtype=self._struct_elem)
-                    if self._struct_elem == numpy.uint8:
-                        slice = slice.astype(numpy.float32) # convert to float
-                        slice = (slice-127.4)/128.          # Normalize
-                        slice = slice.view(numpy.complex64) # reinterpret as complex
-                    if self._struct_elem == numpy.int8:
-                        slice = slice.astype(numpy.float32) # convert to float
-                        slice = slice/128.                  # Normalize
-                        slice = slice.view(numpy.complex64) # reinterpret as complex
-                    if self._struct_elem == numpy.int16:
-                        slice = slice.astype(numpy.float32) # convert to float
-                        slice = slice/32768.                # Normalize
-                        slice = slice.view(numpy.complex64) # reinterpret as complex
-                    fft_result = numpy.absolute(numpy.fft.fftshift(numpy.fft.fft(slice * self._window)))
-
-                    if len(fft_hist)>25: # grace period after start of file
-                        peakl= (fft_result / fft_avg)*len(fft_hist)
+                if state_collector is not None and (start <= index < start + overrun or (stop is not None and stop <= index < end)):
+                    state_collector(index, state())
+                slice = block
+                if fft_result is not None:
+                    if len(noise_floor)>25: # grace period after start of file
+                        peakl= noise_floor.ratio(fft_result)
 
                         if self._verbose:
                             for p in peaks:
@@ -116,7 +303,7 @@ class Detector(object):
                                     print "still peak",
                                 p[1]=self._search_size+self._data_postlen
                             p[1]-=1
-                            p[4] = numpy.append(p[4], slice)
+                            p[4].append(slice)
                             if self._verbose:
                                 print
                                 if (index-p[2])==self._signal_maxlen:
@@ -125,7 +312,7 @@ class Detector(object):
                                 remove_signal(peakl,pi)
                         peakidx=numpy.argmax(peakl)
                         peak=peakl[peakidx]
-                        while(peak>self._fft_peak and burst_mute==0):
+                        while(peak>self._fft_peak and burst_mute==0 and (end is None or index<end)):
                             signals+=1
                             burst_signals+=1
                             if burst_signals==self._burst_size:
@@ -136,7 +323,9 @@ class Detector(object):
                             bin_index = peakidx
                             freq = self._fft_freq[peakidx]*self._sample_rate
                             info = (time_stamp, signal_strength, bin_index, freq)
-                            signal = numpy.append(numpy.concatenate(data_hist), slice)
+                            signal = BurstBuffer(self._burst_capacity)
+                            signal.extend(data_hist)
+                            signal.append(slice)
                             if self._verbose:
                                 print "New peak:",
                                 print "Peak t=%5d (%4.1f dB) B:%3d @ %.0f Hz"%info
@@ -155,21 +344,27 @@ class Detector(object):
 
                     peaks_to_collect = filter(lambda e: e[1]<=0, peaks)
                     for peak in peaks_to_collect:
-                        data_collector(peak[3][0], peak[3][1], peak[3][2], peak[3][3], peak[4])
+                        if peak[2]>=start: # not found while reading up to start
+                            # Handing the burst on (copying it, waiting for a worker) is timed on its own
+                            metrics.stop('detector', t_block)
+                            t_block = metrics.start()
+                            data_collector(peak[3][0], peak[3][1], peak[3][2], peak[3][3], peak[4].signal)
+                            metrics.stop('collector', t_block)
+                            t_block = metrics.start()
                     peaks = filter(lambda e: e[1]>0, peaks)
+                    if end is not None and index>=end and len(peaks)==0:
+                        break
 
                     # keep fft in history buffer and update average
                     if len(peaks)==0: # No output in progress
-                        fft_hist.append(fft_result)
-                        fft_avg+=fft_result
-                        if len(fft_hist)>self._fft_histlen:
-                            fft_avg-=fft_hist[0]
-                            fft_hist.pop(0)
+                        noise_floor.add(fft_result, index)
 
                 # keep slice in history buffer
                 data_hist.append(slice)
-                if len(data_hist)>self._data_histlen:
-                    data_hist.pop(0)
+
+                if t_block is not None:
+                    metrics.stop('detector', t_block)
+                    t_block = metrics.start()
 
         if self._verbose:
             print "%d signals found"%(signals)
@@ -178,6 +373,9 @@ def file_collector(basename, time_stamp, signal_strength, bin_index, freq, signa
     file_name = "%s-%07d-o%+07d.det" % (os.path.basename(basename), time_stamp, freq)
     signal.tofile(file_name)
 
+def burst_file_collector(writer, time_stamp, signal_strength, bin_index, freq, signal):
+    writer.add(time_stamp, freq, signal)
+
 if __name__ == "__main__":
     options, remainder = getopt.getopt(sys.argv[1:], 'r:s:d:vf:p:', [
                                                             'rate=', 
@@ -186,6 +384,10 @@ if __name__ == "__main__":
                                                             'verbose',
                                                             'format=',
                                                             'pipe',
+                                                            'noise-floor=',
+                                                            'mmap',
+                                                            'timing',
+                                                            'bursts',
                                                             ])
     sample_rate = None
     verbose = False
@@ -193,6 +395,9 @@ if __name__ == "__main__":
     fft_peak = 7.0 # about 8.5 dB over noise
     fmt = None
     pipe = None
+    noise_floor = 'moving'
+    use_mmap = False
+    bursts = False # One container instead of a .det file per burst
 
     for opt, arg in options:
         if opt in ('-r', '--rate'):
@@ -207,6 +412,14 @@ if __name__ == "__main__":
             fmt = arg
         elif opt in ('-p', '--pipe'):
             pipe = arg
+        elif opt == '--noise-floor':
+            noise_floor = arg
+        elif opt == '--mmap':
+            use_mmap = True
+        elif opt == '--timing':
+            metrics.recorder = metrics.Metrics()
+        elif opt == '--bursts':
+            bursts = True
 
     if sample_rate == None:
         print >> sys.stderr, "Sample rate missing!"
@@ -224,10 +437,21 @@ if __name__ == "__main__":
         basename="i-%.4f-%s1"%(time.time(),pipe)
         print basename
         file_name = "/dev/stdin"
+        if use_mmap:
+            print >> sys.stderr, "Memory mapping (--mmap) needs an input file!"
+            exit(1)
     else:
         file_name = remainder[0]
         basename= filename= re.sub('\.[^.]*$','',file_name)
 
-    d = Detector(sample_rate, fft_peak=fft_peak, sample_format=fmt, search_size=search_size, verbose=verbose)
-    d.process_file(file_name, partial(file_collector, basename))
+    d = Detector(sample_rate, fft_peak=fft_peak, sample_format=fmt, search_size=search_size, verbose=verbose, noise_floor=noise_floor, use_mmap=use_mmap)
+    if bursts:
+        writer = burst_file.BurstFileWriter(os.path.basename(basename) + ".bursts")
+        d.process_file(file_name, partial(burst_file_collector, writer))
+        writer.close()
+    else:
+        d.process_file(file_name, partial(file_collector, basename))
+
+    if metrics.recorder is not None:
+        print >> sys.stderr, metrics.recorder.summary()
 
@@ -13,81 +13,96 @@ import multiprocessing
 import signal
 import iridium
 import os
+import slab
+import work_queue
+import metrics
+import output
+import chunks
+import Queue
 
-out_queue = multiprocessing.JoinableQueue()
-
-queue_len = 0
-queue_len_max = 0
-
-out_count = 0
-in_count = 0
-drop_count = 0
-ok_count = 0
-
-in_count_total = 0
-out_count_total = 0
-drop_count_total = 0
-ok_count_total = 0
+out_queue = multiprocessing.Queue()
 
 last_print = 0
 t0 = time.time()
 
-queue_blocked = False
-
-def printer(out_queue):
-    global queue_len, last_print, queue_len_max, out_count, in_count
-    global drop_count, drop_count_total, ok_count
-    global ok_count_total, out_count_total, in_count_total, t0
+def printer(out_queue, work, run_metrics, writer):
+    global last_print
+    queue_len_max = 0
+    ok_count = 0
+    ok_count_total = 0
+    last = (0, 0, 0, {}) # submitted, finished, dropped, finished per worker at the last stats line
     while True:
-        msg = out_queue.get()
-        queue_len -= 1
-        out_count += 1
+        try:
+            result = out_queue.get(timeout=1)
+        except Queue.Empty:
+            writer.flush()
+            continue
+        if result is None: # All workers are done
+            writer.close()
+            return
+
+        if len(result) == 2: # A worker started on a burst
+            work.start(result[0])
+            continue
+
+        worker, time_stamp, msg, timing = result
+        work.finish(worker)
+        writer.add(time_stamp, msg)
 
         if msg:
             if "A:OK" in msg:
                 ok_count += 1
-            print msg
 
-        if queue_len > queue_len_max:
-            queue_len_max = queue_len
+        if run_metrics is not None:
+            busy, stages = timing
+            for stage, seconds, cpu_seconds in stages:
+                run_metrics.add(stage, seconds, cpu_seconds)
+            run_metrics.inc('worker_busy_seconds', busy, labels={'worker': worker})
+            if msg:
+                run_metrics.inc('bursts_decoded')
+                if "A:OK" in msg:
+                    run_metrics.inc('bursts_ok')
+
+        if len(work) > queue_len_max:
+            queue_len_max = len(work)
 
         if time.time() - last_print > 60:
             dt = time.time() - last_print
+            submitted, finished, dropped, per_worker = work.submitted, work.finished, work.dropped, dict(work.finished_per_worker)
+            in_count = submitted - last[0]
+            out_count = finished - last[1]
+            drop_count = dropped - last[2]
+
             in_rate = in_count / dt
-            in_count_total += in_count
-            in_rate_avg = in_count_total / (time.time() - t0)
+            in_rate_avg = submitted / (time.time() - t0)
             out_rate = out_count/ dt
             drop_rate = drop_count / dt
             ok_ratio = ok_count / float(out_count)
             ok_rate = ok_count / dt
-            drop_count_total += drop_count
             ok_count_total += ok_count
-            out_count_total += out_count
-            ok_ratio_total = ok_count_total / float(out_count_total)
+            ok_ratio_total = ok_count_total / float(finished)
             ok_rate_avg = ok_count_total / (time.time() - t0)
 
             stats = ""
             stats += "%d" % time.time()
             stats += " | i: %3d/s" % in_rate + " | i_avg: %3d/s" % in_rate_avg
-            stats += " | q: %4d" % queue_len + " | q_max: %4d" % queue_len_max
+            stats += " | q: %4d" % len(work) + " | q_max: %4d" % queue_len_max
+            stats += " | r: %2d" % sum(work.in_flight.values())
             stats += " | o: %2d/s" % out_rate
             stats += " | ok: %3d%%" % (ok_ratio * 100)
             stats += " | ok: %2d/s" % ok_rate
             stats += " | ok_avg: %3d%%" % (ok_ratio_total * 100)
             stats += " | ok: %10d" % ok_count_total
             stats += " | ok_avg: %3d/s" % ok_rate_avg
-            stats += " | d: %d" % drop_count_total
+            stats += " | d: %d" % dropped
+            stats += " | w: " + "/".join("%d" % (per_worker[w] - last[3].get(w, 0)) for w in sorted(per_worker))
             print >> sys.stderr, stats
 
             queue_len_max = 0
-            in_count = 0
-            out_count = 0
-            drop_count = 0
             ok_count = 0
+            last = (submitted, finished, dropped, per_worker)
             last_print = time.time()
 
-        out_queue.task_done()
-
 if __name__ == "__main__":
     options, remainder = getopt.getopt(sys.argv[1:], 'w:c:r:S:vd:f:p:j:oq:b:', ['offset=',
                                                             'window=',
@@ -104,7 +119,18 @@ if __name__ == "__main__":
                                                             'queuelen=',
                                                             'burstsize=',
                                                             'uplink',
-                                                            'downlink'
+                                                            'downlink',
+                                                            'noise-floor=',
+                                                            'mmap',
+                                                            'freq-search=',
+                                                            'shm-slots=',
+                                                            'metrics-file=',
+                                                            'metrics-interval=',
+                                                            'metrics-port=',
+                                                            'timing',
+                                                            'reorder=',
+                                                            'chunk=',
+                                                            'refine=',
                                                             ])
 
     center = None # 1626270833
@@ -121,6 +147,17 @@ if __name__ == "__main__":
     max_queue_len = 1000
     burst_size = 20
     direction = None
+    noise_floor = 'moving'
+    use_mmap = False
+    freq_search = 'fminbound'
+    shm_slots = None # Shared memory burst slots, default depends on jobs
+    metrics_file = None
+    metrics_interval = 10 # Seconds between two lines in metrics_file
+    metrics_port = None
+    timing = False # Print the time spent in each stage at exit
+    reorder_window = 0 # ms of burst time to hold lines back for sorting them
+    chunk_len = None # Seconds of the input file each worker detects and demodulates on its own
+    refine_below = None # Demodulate bursts with less confidence (in %) again with the measured frequency offset
 
     for opt, arg in options:
         if opt in ('-w', '--search-window'):
@@ -153,6 +190,28 @@ if __name__ == "__main__":
             direction = iridium.UPLINK
         elif opt == '--downlink':
             direction = iridium.DOWNLINK
+        elif opt == '--noise-floor':
+            noise_floor = arg
+        elif opt == '--mmap':
+            use_mmap = True
+        elif opt == '--freq-search':
+            freq_search = arg
+        elif opt == '--shm-slots':
+            shm_slots = int(arg)
+        elif opt == '--metrics-file':
+            metrics_file = arg
+        elif opt == '--metrics-interval':
+            metrics_interval = float(arg)
+        elif opt == '--metrics-port':
+            metrics_port = int(arg)
+        elif opt == '--timing':
+            timing = True
+        elif opt == '--reorder':
+            reorder_window = float(arg)
+        elif opt == '--chunk':
+            chunk_len = float(arg)
+        elif opt == '--refine':
+            refine_below = float(arg)
 
 
     if sample_rate == None:
@@ -172,62 +231,183 @@ if __name__ == "__main__":
             pipe="t"
         basename="i-%.4f-%s1"%(time.time(),pipe)
         file_name = "/dev/stdin"
+        if use_mmap:
+            print >> sys.stderr, "Memory mapping (--mmap) needs an input file!"
+            exit(1)
+        if chunk_len is not None:
+            print >> sys.stderr, "Chunked processing (--chunk) needs an input file!"
+            exit(1)
     else:
         file_name = remainder[0]
         basename= filename= re.sub('\.[^.]*$','',file_name)
 
-    det = detector.Detector(sample_rate=sample_rate, fft_peak=fft_peak, sample_format=fmt, search_size=search_size, verbose=verbose, signal_width=search_window, burst_size=burst_size)
-    cad = cut_and_downmix.CutAndDownmix(center=center, input_sample_rate=sample_rate, search_depth=search_depth, verbose=verbose, search_window=search_window)
+    det = detector.Detector(sample_rate=sample_rate, fft_peak=fft_peak, sample_format=fmt, search_size=search_size, verbose=verbose, signal_width=search_window, burst_size=burst_size, noise_floor=noise_floor, use_mmap=use_mmap)
+    cad = cut_and_downmix.CutAndDownmix(center=center, input_sample_rate=sample_rate, search_depth=search_depth, verbose=verbose, search_window=search_window, freq_search=freq_search)
     dem = demod.Demod(sample_rate=cad.output_sample_rate, verbose=verbose)
 
-    def process_one(basename, time_stamp, signal_strength, bin_index, freq, signal):
+    def decode(basename, time_stamp, freq, signal):
+        # The output line of one burst, None if it could not be decoded
         try:
-            msg = None
-            try:
-                mix_signal, mix_freq, mix_direction = cad.cut_and_downmix(signal=signal, search_offset=freq, direction=direction)
-                dataarray, data, access_ok, lead_out_ok, confidence, level, nsymbols = dem.demod(signal=mix_signal, direction=mix_direction)
-                msg = "RAW: %s %09d %010d A:%s L:%s %3d%% %.3f %3d %s"%(basename,time_stamp,mix_freq,("no","OK")[access_ok],("no","OK")[lead_out_ok],confidence,level,(nsymbols-12),data)
-            except cut_and_downmix.DownmixError:
-                pass
-            out_queue.put(msg)
+            mix_signal, mix_freq, mix_direction = cad.cut_and_downmix(signal=signal, search_offset=freq, direction=direction)
+            dataarray, data, access_ok, lead_out_ok, confidence, level, nsymbols, final_offset = dem.demod(signal=mix_signal, direction=mix_direction, return_final_offset=True)
+            if refine_below is not None and confidence < refine_below:
+                # Second pass on the same cut, corrected by the offset the first one ended up with
+                t0 = metrics.start()
+                refined = dem.demod(signal=cad.shift(mix_signal, -final_offset), direction=mix_direction, return_final_offset=True)
+                if (refined[2], refined[4]) > (access_ok, confidence):
+                    dataarray, data, access_ok, lead_out_ok, confidence, level, nsymbols, _ = refined
+                    mix_freq -= final_offset
+                metrics.stop('refine', t0)
+            return "RAW: %s %09d %010d A:%s L:%s %3d%% %.3f %3d %s"%(basename,time_stamp,mix_freq,("no","OK")[access_ok],("no","OK")[lead_out_ok],confidence,level,(nsymbols-12),data)
+        except cut_and_downmix.DownmixError:
+            pass
         except:
             import traceback
             traceback.print_exc()
+        return None
+
+    def process_one(basename, time_stamp, signal_strength, bin_index, freq, signal):
+        out_queue.put((os.getpid(), time_stamp)) # The burst is in flight on this worker
+        t0 = time.time()
+        msg = None
+        try:
+            msg = decode(basename, time_stamp, freq, signal)
+        finally:
+            # Always report back, the burst counts as queued until then
+            timing = None
+            if metrics.recorder is not None:
+                timing = (time.time() - t0, metrics.recorder.take())
+            out_queue.put((os.getpid(), time_stamp, msg, timing))
 
     def wrap_process(time_stamp, signal_strength, bin_index, freq, signal):
-        global queue_len, queue_blocked, in_count, drop_count
-        if offline:
-            if queue_len > max_queue_len:
-                while queue_len > max_queue_len/2:
-                    time.sleep(1)
+        if not work.submit():
+            return
+        args = (basename, time_stamp, signal_strength, bin_index, freq)
+        if bursts is not None:
+            bursts.submit(workers, process_one, args, signal)
         else:
-            if queue_len > max_queue_len:
-                queue_blocked = True
-            if queue_blocked and queue_len < (max_queue_len / 10):
-                queue_blocked = False
-            if queue_blocked:
-                drop_count += 1
-                return
-        queue_len += 1
-        in_count += 1
-        workers.apply_async(process_one,(basename, time_stamp, signal_strength, bin_index, freq, signal))
+            workers.apply_async(process_one, args + (signal,))
+
+    def process_chunk(chunk):
+        # Detects and decodes the bursts of one chunk of the input file in this worker
+        t0 = time.time()
+        found = []
+        def collect(time_stamp, signal_strength, bin_index, freq, signal):
+            block = int(round(time_stamp / det.block_duration))
+            found.append((block, time_stamp, freq, decode(basename, time_stamp, freq, signal)))
+        states = {}
+        def collect_state(index, state):
+            states[index] = state
+        start, stop, overrun = chunk
+        det.process_file(file_name, collect, start=start, stop=stop, overrun=overrun, state_collector=collect_state)
+        timing = None
+        if metrics.recorder is not None:
+            timing = (time.time() - t0, metrics.recorder.take())
+        return os.getpid(), found, states, timing
 
     def init_worker():
         signal.signal(signal.SIGINT, signal.SIG_IGN)
+        if run_metrics is not None:
+            # Workers send their stage timings along with the results
+            metrics.recorder = metrics.StageLog()
+
+    # Offline processing waits for the workers, live processing drops bursts
+    work = work_queue.WorkQueue(max_queue_len, block=offline)
+
+    run_metrics = None
+    if metrics_file is not None or metrics_port is not None or timing:
+        run_metrics = metrics.Metrics()
+        metrics.recorder = run_metrics # the detector runs in this process
+        run_metrics.gauge('queue_depth', lambda: len(work))
+        run_metrics.gauge('bursts_in_flight', lambda: sum(work.in_flight.values()))
+        run_metrics.gauge('bursts_submitted', lambda: work.submitted, 'counter')
+        run_metrics.gauge('bursts_dropped', lambda: work.dropped, 'counter')
+        run_metrics.gauge('bursts_finished', lambda: work.finished, 'counter')
+        run_metrics.gauge('workers', lambda: jobs)
+        if metrics_file is not None:
+            run_metrics.write_json_lines(metrics_file, metrics_interval)
+        if metrics_port is not None:
+            run_metrics.serve(metrics_port)
+
+    writer = output.OutputWriter(sys.stdout, window=reorder_window)
+
+    def process_chunks():
+        # Chunks are handed out to the workers as they get idle, their results are written in order
+        overlap = chunks.OverlapFilter(det.block_duration)
+        chunk_blocks = int(chunk_len * 1000 / det.block_duration)
+        chunk_list = chunks.split(det.file_blocks(file_name), chunk_blocks)
+        # Blocks each chunk goes on after its end to meet the state of the next one
+        overrun = min(2 * det.history_blocks, chunk_blocks)
+        workers = multiprocessing.Pool(processes=jobs, initializer=init_worker)
+        try:
+            results = workers.imap(process_chunk, [(start, stop, overrun) for start, stop in chunk_list])
+            for number, (start, stop) in enumerate(chunk_list):
+                worker, found, states, timing = results.next()
+                bursts = overlap.chunk(start, stop, found, states)
+                for block, time_stamp, freq, msg in bursts:
+                    work.submit()
+                    work.finish(worker)
+                    writer.add(time_stamp, msg)
+                    if run_metrics is not None and msg:
+                        run_metrics.inc('bursts_decoded')
+                        if "A:OK" in msg:
+                            run_metrics.inc('bursts_ok')
+                if run_metrics is not None:
+                    busy, stages = timing
+                    for stage, seconds, cpu_seconds in stages:
+                        run_metrics.add(stage, seconds, cpu_seconds)
+                    run_metrics.inc('worker_busy_seconds', busy, labels={'worker': worker})
+                print >> sys.stderr, "chunk %d/%d: %.1f s | bursts: %d" % (number + 1, len(chunk_list), stop * det.block_duration / 1000, len(bursts))
+        except KeyboardInterrupt:
+            print "Going to DIE"
+            workers.terminate()
+            raise
+        workers.close()
+        workers.join()
+        writer.close()
+        if overlap.inexact:
+            print >> sys.stderr, "%d chunk borders did not meet the state of a whole file run, %d bursts found in two chunks" % (overlap.inexact, overlap.duplicates)
+
+    def process_stream():
+        global workers
+        out_thread = threading.Thread(target=printer, args = (out_queue, work, run_metrics, writer))
+        out_thread.daemon = True
+        out_thread.start()
 
-    out_thread = threading.Thread(target=printer, args = (out_queue,))
-    out_thread.daemon = True
-    out_thread.start()
-
-    workers = multiprocessing.Pool(processes=jobs, initializer=init_worker)
-    try:
-        det.process_file(file_name, wrap_process)
-    except KeyboardInterrupt:
-        print "Going to DIE"
-        out_queue.join()
-        raise
-
-    workers.close()
-    workers.join()
-    out_queue.join()
+        workers = multiprocessing.Pool(processes=jobs, initializer=init_worker)
+
+        def drain():
+            # Wait for the outstanding bursts, then let the output thread write the rest
+            workers.close()
+            workers.join()
+            out_queue.put(None)
+            out_thread.join()
+
+        try:
+            det.process_file(file_name, wrap_process)
+        except KeyboardInterrupt:
+            print "Going to DIE"
+            drain()
+            raise
+
+        drain()
+
+    # Bursts go to the workers through shared memory, pickled only if no slot is free
+    if shm_slots is None:
+        shm_slots = 16 * jobs
+    bursts = None
+    if shm_slots > 0 and chunk_len is None:
+        bursts = slab.BurstSlab(shm_slots, det.burst_capacity)
+
+    if chunk_len is not None:
+        process_chunks()
+    else:
+        process_stream()
+    if writer.late:
+        print >> sys.stderr, "%d lines came too late to be sorted in" % writer.late
+    print >> sys.stderr, "bursts: %d | processed: %d | dropped: %d" % (work.submitted + work.dropped, work.finished, work.dropped)
+    if metrics_file is not None:
+        run_metrics.append_json_line(metrics_file)
+    if timing:
+        print >> sys.stderr, run_metrics.summary()
     print "Done."
@@ -0,0 +1,199 @@
+# vim: set ts=4 sw=4 tw=0 et pm=:
+import bisect
+import functools
+import json
+import threading
+import time
+import BaseHTTPServer
+
+# Stage timings of this process go to recorder.add(stage, seconds, cpu_seconds) if it is set.
+# time.clock() is the CPU time of the whole process, so stages running in parallel
+# threads (detector and output in the extractor) are charged each other's CPU time.
+recorder = None
+
+# Upper bounds of the latency histogram buckets in seconds
+LATENCY_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0)
+
+PREFIX = "iridium_extractor_"
+
+def start():
+    """ Start of a probe, pass the result to stop(). None if nothing is recorded. """
+    if recorder is None:
+        return None
+    return time.time(), time.clock()
+
+def stop(stage, started):
+    """ Reports the time since start() as stage """
+    if started is not None:
+        recorder.add(stage, time.time() - started[0], time.clock() - started[1])
+
+def timed(stage):
+    """ Decorator reporting the time of every call to recorder as stage """
+    def wrap(f):
+        @functools.wraps(f)
+        def timed_f(*args, **kwargs):
+            if recorder is None:
+                return f(*args, **kwargs)
+            started = start()
+            try:
+                return f(*args, **kwargs)
+            finally:
+                stop(stage, started)
+        return timed_f
+    return wrap
+
+class StageLog(object):
+    """ Recorder for worker processes, keeps the timings until they are sent to the parent """
+    def __init__(self):
+        self._log = []
+
+    def add(self, stage, seconds, cpu_seconds):
+        self._log.append((stage, seconds, cpu_seconds))
+
+    def take(self):
+        log = self._log
+        self._log = []
+        return log
+
+class Histogram(object):
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1) # last one is +Inf
+        self.sum = 0.
+        self.count = 0
+        self.max = 0.
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+        if value > self.max:
+            self.max = value
+
+class Metrics(object):
+    """ Counters, gauges and stage latency histograms of one extractor run.
+
+        Used from the detector thread, the output thread and the exporters,
+        so everything goes through one lock. Gauges are functions which are
+        evaluated when the metrics are exported.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters = {} # (name, labels) -> value
+        self._gauges = {}   # name -> (function, type)
+        self._stages = {}   # stage -> Histogram of the wall time
+        self._cpu = {}      # stage -> CPU seconds
+        self._t0 = time.time()
+
+    def inc(self, name, value=1, labels=()):
+        key = (name, tuple(sorted(dict(labels).items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def gauge(self, name, function, type='gauge'):
+        """ Exports function() as name. type 'counter' for functions returning a total. """
+        self._gauges[name] = (function, type)
+
+    def add(self, stage, seconds, cpu_seconds):
+        with self._lock:
+            if stage not in self._stages:
+                self._stages[stage] = Histogram()
+                self._cpu[stage] = 0.
+            self._stages[stage].observe(seconds)
+            self._cpu[stage] += cpu_seconds
+
+    def snapshot(self):
+        """ Everything as one dict, suitable for json """
+        with self._lock:
+            counters = {}
+            for (name, labels), value in self._counters.items():
+                if labels:
+                    counters.setdefault(name, {})[",".join("%s=%s" % l for l in labels)] = value
+                else:
+                    counters[name] = value
+            stages = dict((stage, {'count': h.count, 'sum': h.sum, 'cpu': self._cpu[stage], 'buckets': h.counts})
+                                for stage, h in self._stages.items())
+        for name, (function, _) in self._gauges.items():
+            counters[name] = function()
+        return {'time': time.time(), 'uptime': time.time() - self._t0, 'metrics': counters,
+                    'stages': stages, 'buckets': LATENCY_BUCKETS}
+
+    def prometheus(self):
+        """ Everything in the Prometheus text exposition format """
+        lines = []
+        with self._lock:
+            last_name = None
+            for (name, labels), value in sorted(self._counters.items()):
+                label_text = ",".join('%s="%s"' % l for l in labels)
+                if label_text:
+                    label_text = "{%s}" % label_text
+                if name != last_name:
+                    lines.append("# TYPE %s%s_total counter" % (PREFIX, name))
+                    last_name = name
+                lines.append("%s%s_total%s %s" % (PREFIX, name, label_text, value))
+
+            lines.append("# TYPE %sstage_seconds histogram" % PREFIX)
+            for stage, h in sorted(self._stages.items()):
+                cumulative = 0
+                for bound, count in zip(h.buckets + ('+Inf',), h.counts):
+                    cumulative += count
+                    lines.append('%sstage_seconds_bucket{stage="%s",le="%s"} %d' % (PREFIX, stage, bound, cumulative))
+                lines.append('%sstage_seconds_sum{stage="%s"} %f' % (PREFIX, stage, h.sum))
+                lines.append('%sstage_seconds_count{stage="%s"} %d' % (PREFIX, stage, h.count))
+
+            lines.append("# TYPE %sstage_cpu_seconds_total counter" % PREFIX)
+            for stage, cpu in sorted(self._cpu.items()):
+                lines.append('%sstage_cpu_seconds_total{stage="%s"} %f' % (PREFIX, stage, cpu))
+
+        for name, (function, type) in sorted(self._gauges.items()):
+            if type == 'counter':
+                name += "_total"
+            lines.append("# TYPE %s%s %s" % (PREFIX, name, type))
+            lines.append("%s%s %s" % (PREFIX, name, function()))
+        return "\n".join(lines) + "\n"
+
+    def summary(self):
+        """ Table of calls, wall and CPU time per stage """
+        lines = ["%-34s %8s %10s %10s %10s %10s" % ("stage", "calls", "wall [s]", "mean [ms]", "max [ms]", "cpu [s]")]
+        with self._lock:
+            for stage, h in sorted(self._stages.items()):
+                lines.append("%-34s %8d %10.3f %10.3f %10.3f %10.3f" % (stage, h.count, h.sum,
+                                    h.sum / h.count * 1000, h.max * 1000, self._cpu[stage]))
+        return "\n".join(lines)
+
+    def write_json_lines(self, file_name, interval):
+        """ Appends a snapshot to file_name every interval seconds, from a daemon thread """
+        def writer():
+            while True:
+                time.sleep(interval)
+                self.append_json_line(file_name)
+        thread = threading.Thread(target=writer)
+        thread.daemon = True
+        thread.start()
+
+    def append_json_line(self, file_name):
+        with open(file_name, "a") as f:
+            f.write(json.dumps(self.snapshot()) + "\n")
+
+    def serve(self, port, address="127.0.0.1"):
+        """ Serves the Prometheus text on http://address:port/metrics from a daemon thread """
+        metrics = self
+        class Handler(BaseHTTPServer.BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path != "/metrics":
+                    self.send_error(404)
+                    return
+                body = metrics.prometheus()
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        server = BaseHTTPServer.HTTPServer((address, port), Handler)
+        thread = threading.Thread(target=server.serve_forever)
+        thread.daemon = True
+        thread.start()
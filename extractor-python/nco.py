@@ -0,0 +1,40 @@
+# vim: set ts=4 sw=4 tw=0 et pm=:
+import numpy
+
+class Oscillator(object):
+    """ Complex oscillator producing exp(1j*(2*pi*frequency*n/sample_rate + phase)).
+
+        Instead of evaluating exp() for every sample, a table holding the
+        first block_len rotations is multiplied with one rotation per block.
+        The phase continues from one call to the next.
+    """
+    def __init__(self, frequency, sample_rate, phase=0, block_len=256):
+        self._step = 2*numpy.pi*frequency/float(sample_rate)
+        self._block_len = block_len
+        self._table = numpy.exp(complex(0,1)*self._step*numpy.arange(block_len))
+        self._phase = phase
+
+    @property
+    def phase(self):
+        return self._phase
+
+    def rotation(self, length, out=None):
+        """ The next length rotations, written to out if given """
+        if out is None:
+            out = numpy.empty(length, dtype=numpy.complex128)
+
+        nblocks = length // self._block_len
+        rest = length - nblocks * self._block_len
+        starts = numpy.exp(complex(0,1)*(self._phase + self._step*self._block_len*numpy.arange(nblocks + 1)))
+        numpy.multiply.outer(starts[:nblocks], self._table, out=out[:nblocks*self._block_len].reshape(nblocks, self._block_len))
+        if rest:
+            numpy.multiply(starts[nblocks], self._table[:rest], out=out[nblocks*self._block_len:])
+
+        self._phase = (self._phase + self._step*length) % (2*numpy.pi)
+        return out
+
+    def mix(self, signal, out=None):
+        """ signal multiplied with the next len(signal) rotations """
+        out = self.rotation(len(signal), out)
+        out *= signal
+        return out
@@ -0,0 +1,65 @@
+# vim: set ts=4 sw=4 tw=0 et pm=:
+import heapq
+import time
+
+class OutputWriter(object):
+    """ Writes result lines in batches, optionally sorted by burst time.
+
+        With a window > 0 each line is held back until a burst at least
+        window later (in the unit of the time stamps) has been seen, so lines
+        from workers finishing out of order come out sorted. A line older
+        than one already written can not be sorted in any more. It is
+        written right away and counted in late.
+    """
+    def __init__(self, out, window=0, batch_lines=100, flush_interval=1.):
+        self._out = out
+        self._window = window
+        self._batch_lines = batch_lines
+        self._flush_interval = flush_interval
+        self._held = [] # heap of (time stamp, arrival, line)
+        self._arrivals = 0
+        self._latest = None # newest time stamp seen
+        self._written = None # time stamp of the last sorted line written
+        self._batch = []
+        self._last_flush = time.time()
+        self.late = 0
+
+    def add(self, time_stamp, line):
+        """ line may be None, the time stamp still moves the window on """
+        if self._window <= 0:
+            if line is not None:
+                self._batch.append(line)
+        else:
+            if self._latest is None or time_stamp > self._latest:
+                self._latest = time_stamp
+            if line is not None:
+                if self._written is not None and time_stamp < self._written:
+                    self.late += 1
+                    self._batch.append(line)
+                else:
+                    heapq.heappush(self._held, (time_stamp, self._arrivals, line))
+                    self._arrivals += 1
+            while self._held and self._held[0][0] <= self._latest - self._window:
+                self._release()
+
+        if len(self._batch) >= self._batch_lines or time.time() - self._last_flush > self._flush_interval:
+            self.flush()
+
+    def _release(self):
+        time_stamp, _, line = heapq.heappop(self._held)
+        self._written = time_stamp
+        self._batch.append(line)
+
+    def flush(self):
+        """ Writes the current batch, lines held for sorting stay """
+        if self._batch:
+            self._out.write("\n".join(self._batch) + "\n")
+            self._batch = []
+        self._out.flush()
+        self._last_flush = time.time()
+
+    def close(self):
+        """ Writes everything, including the held lines """
+        while self._held:
+            self._release()
+        self.flush()
@@ -0,0 +1,64 @@
+# vim: set ts=4 sw=4 tw=0 et pm=:
+import numpy
+
+# Raw element type of each supported sample format
+FORMATS = {
+    'rtl': numpy.uint8,     # complex uint8 (RTLSDR)
+    'hackrf': numpy.int8,   # complex int8 (hackrf, rad1o)
+    'sc16': numpy.int16,    # complex int16 (USRP)
+    'float': numpy.complex64,
+}
+
+class SampleConverter(object):
+    """ Converts raw samples of one of the FORMATS to complex64.
+
+        8 bit formats are converted with a lookup table indexed by a whole
+        I/Q byte pair. All others are scaled arithmetically. The result is
+        written to a caller supplied complex64 buffer if given.
+    """
+    def __init__(self, sample_format, offset=None, scale=1):
+        if sample_format not in FORMATS:
+            raise Exception("Unknown sample format: %s" % sample_format)
+        self._elem = FORMATS[sample_format]
+        self._scale = scale
+        self._lut = None
+
+        if sample_format == 'rtl':
+            if offset is None:
+                offset = 127.4
+            values = (numpy.arange(256, dtype=numpy.float32)-offset)/128.
+        elif sample_format == 'hackrf':
+            values = numpy.arange(256).astype(numpy.uint8).view(numpy.int8).astype(numpy.float32)/128.
+        else:
+            return
+
+        if scale != 1:
+            values = values*scale
+        # Index is the little endian uint16 made from one I/Q byte pair
+        pair = numpy.arange(65536)
+        self._lut = numpy.empty(65536, dtype=numpy.complex64)
+        self._lut.real = values[pair & 0xff]
+        self._lut.imag = values[pair >> 8]
+
+    @property
+    def element(self):
+        return self._elem
+
+    def convert(self, data, out=None):
+        """ data is an array of raw elements, out (optional) a complex64 array
+            with the same shape apart from the last axis holding the samples.
+            complex64 input is returned as is. """
+        if self._elem == numpy.complex64:
+            return data
+        if out is None:
+            out = numpy.empty(data.shape[:-1] + (data.shape[-1]//2,), dtype=numpy.complex64)
+
+        if self._lut is not None:
+            self._lut.take(numpy.ascontiguousarray(data).view('<u2'), out=out)
+        elif self._elem == numpy.int16:
+            real = out.view(numpy.float32)
+            real[...] = data       # convert to float
+            real /= 32768.         # Normalize
+            if self._scale != 1:
+                real *= self._scale
+        return out
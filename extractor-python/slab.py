@@ -0,0 +1,60 @@
+# vim: set ts=4 sw=4 tw=0 et pm=:
+import mmap
+import Queue
+import traceback
+import numpy
+
+_slab = None # The slab of this process, the forked workers inherit it
+
+class BurstSlab(object):
+    """ Fixed size burst slots in memory shared with forked worker processes.
+
+        The parent copies a burst into a free slot with put() and only passes
+        the slot number and length on. Workers read the burst with get(), the
+        parent hands the slot back with release() once the worker is done.
+        submit() does all of that for a job on a multiprocessing.Pool.
+        Must be created before the workers are forked, one per process.
+    """
+    def __init__(self, nslots, slot_len):
+        global _slab
+        _slab = self
+        self._map = mmap.mmap(-1, nslots * slot_len * numpy.dtype(numpy.complex64).itemsize)
+        self._slots = numpy.frombuffer(self._map, dtype=numpy.complex64).reshape(nslots, slot_len)
+        self._free = Queue.LifoQueue() # Reuse recently used slots, the others stay untouched
+        for slot in reversed(xrange(nslots)):
+            self._free.put(slot)
+
+    def put(self, signal):
+        """ Slot number holding a copy of signal, None if it is too long or no slot is free """
+        if len(signal) > self._slots.shape[1]:
+            return None
+        try:
+            slot = self._free.get_nowait()
+        except Queue.Empty:
+            return None
+        self._slots[slot, :len(signal)] = signal
+        return slot
+
+    def get(self, slot, length):
+        return self._slots[slot, :length]
+
+    def release(self, slot):
+        self._free.put(slot)
+
+    def submit(self, pool, func, args, signal):
+        """ Runs func(*args + (signal,)) on pool, with signal in a slot if one
+            is free. The slot comes back when the job is done, also if it failed. """
+        slot = self.put(signal)
+        if slot is None:
+            pool.apply_async(func, args + (signal,))
+        else:
+            pool.apply_async(_run_slot, (func, args, slot, len(signal)), callback=self.release)
+
+def _run_slot(func, args, slot, length):
+    # The callback only sees the return value, so the slot is returned
+    # whatever happens to the burst
+    try:
+        func(*args + (_slab.get(slot, length),))
+    except Exception:
+        traceback.print_exc()
+    return slot
@@ -0,0 +1,65 @@
+#!/usr/bin/env python
+# vim: set ts=4 sw=4 tw=0 et pm=:
+# Synthetic captures with Iridium like bursts, for the tests
+import sys
+import numpy
+import filters
+
+symbols_per_second = 25000
+uw_dl = [0,2,2,2,2,0,0,0,2,0,0,2]
+uw_ul = [2,2,0,0,0,2,0,0,2,0,2,2]
+iridium_lead_out = "100101111010110110110011001111"
+
+def capture(file_name, seed=1, duration=6.0, sample_rate=2000000):
+    """ Writes duration seconds of noise with random down- and uplink bursts
+        as hackrf samples to file_name, returns the number of bursts """
+    rng = numpy.random.RandomState(seed)
+    sps = sample_rate // symbols_per_second
+    n = int(sample_rate * duration)
+    sig = (rng.randn(n) + 1j*rng.randn(n)) * 0.02
+    rrc = filters.rrcosfilter(161, 0.4, 1./symbols_per_second, sample_rate)[1]
+    t = 0.05
+    count = 0
+    while t < duration - 0.05:
+        for k in range(rng.randint(1, 4)):
+            up = rng.rand() < 0.3
+            nsym = rng.choice([179, 432, 100])
+            if up:
+                pre = [2,0]*8
+                uw = uw_ul
+            else:
+                pre = [0]*16
+                uw = uw_dl
+            data = list(rng.randint(0, 4, nsym))
+            # append lead out as differential symbols
+            bits = [int(c) for c in iridium_lead_out]
+            inv = {(0,0):0,(1,0):1,(1,1):2,(0,1):3}
+            last = data[-1]
+            for i in range(0, len(bits), 2):
+                d = inv[(bits[i], bits[i+1])]
+                last = (last + d) % 4
+                data.append(last)
+            syms = pre + uw + data
+            phases = numpy.exp(1j*(numpy.pi/4 + numpy.pi/2*numpy.array(syms)))
+            padded = numpy.zeros(len(syms)*sps, dtype=complex)
+            padded[::sps] = phases
+            burst = numpy.convolve(padded, rrc)
+            f = rng.uniform(-400e3, 400e3) + rng.uniform(-150, 150)
+            start = int((t + rng.uniform(0, 0.03)) * sample_rate)
+            amp = rng.uniform(0.1, 0.5)
+            burst = burst * amp * numpy.exp(2j*numpy.pi*f*numpy.arange(len(burst))/sample_rate + 1j*rng.uniform(0, 6.28))
+            end = min(n, start + len(burst))
+            sig[start:end] += burst[:end-start]
+            count += 1
+        t += rng.uniform(0.02, 0.09)
+    sig = numpy.clip(sig, -0.99, 0.99)
+    out = numpy.empty(2*n, dtype=numpy.int8)
+    out[0::2] = numpy.round(sig.real*127)
+    out[1::2] = numpy.round(sig.imag*127)
+    out.tofile(file_name)
+    return count
+
+if __name__ == "__main__":
+    seed = int(sys.argv[2]) if len(sys.argv) > 2 else 1
+    duration = float(sys.argv[3]) if len(sys.argv) > 3 else 6.0
+    print >> sys.stderr, "%d bursts" % capture(sys.argv[1], seed, duration)
@@ -0,0 +1,126 @@
+#!/usr/bin/env python
+
+import hashlib
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import unittest
+from functools import partial
+
+import numpy
+
+import burst_file
+import cut_and_downmix
+import demod
+import detector
+import synthetic
+
+
+def digest(signal):
+    return hashlib.md5(numpy.asarray(signal, dtype=numpy.complex64).tostring()).hexdigest()
+
+class BurstFileTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.tempdir = tempfile.mkdtemp()
+        capture = os.path.join(cls.tempdir, 'capture.hackrf')
+        synthetic.capture(capture, seed=2, duration=1.0)
+
+        # The detector writes the container, the same bursts are kept here
+        cls.container = os.path.join(cls.tempdir, 'capture.bursts')
+        cls.found = []
+        writer = burst_file.BurstFileWriter(cls.container)
+        def collect(time_stamp, signal_strength, bin_index, freq, signal):
+            cls.found.append((time_stamp, freq, signal.astype(numpy.complex64)))
+            detector.burst_file_collector(writer, time_stamp, signal_strength, bin_index, freq, signal)
+        d = detector.Detector(2000000, sample_format='hackrf')
+        d.process_file(capture, collect)
+        writer.close()
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.tempdir)
+
+    def copy(self, name):
+        """ Copy of the container as name.bursts/name.index """
+        for source, target in zip(burst_file.names(self.container), burst_file.names(os.path.join(self.tempdir, name))):
+            shutil.copyfile(source, target)
+        return burst_file.names(os.path.join(self.tempdir, name))
+
+    def tool(self, *args):
+        script = os.path.join(os.path.dirname(os.path.abspath(__file__)), args[0])
+        return subprocess.check_output([sys.executable, script] + list(args[1:]), cwd=self.tempdir)
+
+    def test_index(self):
+        self.assertTrue(len(self.found) > 20)
+        bursts = burst_file.BurstFile(self.container)
+        lengths = [len(signal) for _, _, signal in self.found]
+        self.assertEqual(list(bursts.index['time']), [time_stamp for time_stamp, _, _ in self.found])
+        self.assertEqual(list(bursts.index['freq']), [freq for _, freq, _ in self.found])
+        self.assertEqual(list(bursts.index['length']), lengths)
+        self.assertEqual(list(bursts.index['offset']), list(numpy.cumsum([0] + lengths[:-1])))
+        self.assertEqual(os.path.getsize(burst_file.names(self.container)[0]), sum(lengths) * 8)
+
+    def test_round_trip(self):
+        expected = [(time_stamp, freq, digest(signal)) for time_stamp, freq, signal in self.found]
+        for name in burst_file.names(self.container):
+            self.assertTrue(burst_file.is_container(name))
+            bursts = burst_file.BurstFile(name)
+            self.assertEqual(len(bursts), len(self.found))
+            self.assertEqual([(time_stamp, freq, digest(signal)) for time_stamp, freq, signal in bursts], expected, name)
+
+    def test_truncated_index(self):
+        # A writer stopped in the middle of an index record
+        data_name, index_name = self.copy('truncated-index')
+        with open(index_name, 'r+b') as f:
+            f.truncate(os.path.getsize(index_name) - 5)
+        bursts = burst_file.BurstFile(index_name)
+        self.assertEqual(len(bursts), len(self.found) - 1)
+        self.assertEqual([digest(signal) for _, _, signal in bursts], [digest(signal) for _, _, signal in self.found[:-1]])
+
+    def test_truncated_data(self):
+        data_name, index_name = self.copy('truncated-data')
+        with open(data_name, 'r+b') as f:
+            f.truncate(os.path.getsize(data_name) - 8)
+        self.assertRaises(ValueError, burst_file.BurstFile, data_name)
+
+    def test_corrupt_index(self):
+        data_name, index_name = self.copy('corrupt')
+        index = numpy.fromfile(index_name, dtype=burst_file.INDEX_DTYPE)
+        index[len(index) // 2]['offset'] = -1
+        index.tofile(index_name)
+        self.assertRaises(ValueError, burst_file.BurstFile, data_name)
+
+    def test_tools(self):
+        # cut_and_downmix.py and demod.py on the container give the same
+        # as the classes on the bursts one by one
+        cad = cut_and_downmix.CutAndDownmix(center=1626000000, input_sample_rate=2000000)
+        d = demod.Demod(sample_rate=cad.output_sample_rate)
+        expected = []
+        for time_stamp, freq, signal in self.found:
+            try:
+                signal, freq, _ = cad.cut_and_downmix(signal=signal, search_offset=freq)
+            except cut_and_downmix.DownmixError:
+                continue
+            dataarray, data, access_ok, lead_out_ok, confidence, level, nsymbols = d.demod(signal.astype(numpy.complex64))
+            expected.append("RAW: capture %07d %010d A:%s L:%s %3d%% %.3f %3d %s" % (time_stamp, freq, ("no","OK")[access_ok], ("no","OK")[lead_out_ok], confidence, level, (nsymbols-12), data))
+        self.assertTrue(len(expected) > 20)
+
+        self.tool('cut_and_downmix.py', '-r', '2000000', '-c', '1626000000', 'capture.bursts')
+        self.assertEqual(len(burst_file.BurstFile(os.path.join(self.tempdir, 'capture-cut.index'))), len(expected))
+        output = self.tool('demod.py', '-r', '500000', 'capture-cut.bursts')
+        self.assertEqual([line for line in output.splitlines() if line.startswith('RAW:')], expected)
+
+    def test_cut_demod_2pass(self):
+        output = self.tool('cut_demod_2pass.py', '-r', '2000000', '-c', '1626000000', 'capture.index')
+        time_stamps = [int(line.split()[2]) for line in output.splitlines() if line.startswith('RAW:')]
+        self.assertTrue(len(time_stamps) > 40)
+        # Two passes per burst, in the order of the container
+        self.assertEqual(time_stamps[::2], time_stamps[1::2])
+        self.assertTrue(set(time_stamps) <= set(int(time_stamp) for time_stamp, _, _ in self.found))
+
+
+if __name__ == "__main__":
+    unittest.main()
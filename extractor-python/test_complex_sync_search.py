@@ -0,0 +1,65 @@
+#!/usr/bin/env python
+
+import os
+import shutil
+import tempfile
+import unittest
+
+import numpy
+
+import complex_sync_search
+import cut_and_downmix
+import detector
+import synthetic
+
+
+class FreqSearchTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        # The downlink burst at 749 ms correlates best at the +99 Hz end of
+        # the search range, its sync word is a smaller peak at about -30 Hz
+        cls.tempdir = tempfile.mkdtemp()
+        capture = os.path.join(cls.tempdir, 'capture.hackrf')
+        synthetic.capture(capture, seed=1, duration=6.0)
+
+        cls.preambles = []
+        cad = cut_and_downmix.CutAndDownmix(center=1626000000, input_sample_rate=2000000)
+        cls.sample_rate = cad.output_sample_rate
+        estimate = cad._sync_search.estimate_sync_word_freq
+        def record(signal, preamble_length, direction):
+            cls.preambles.append((signal.copy(), preamble_length, direction))
+            return estimate(signal, preamble_length, direction)
+        cad._sync_search.estimate_sync_word_freq = record
+
+        def collect(time_stamp, signal_strength, bin_index, freq, signal):
+            if 749 <= time_stamp < 750:
+                cad.cut_and_downmix(signal=signal, search_offset=freq)
+        d = detector.Detector(2000000, sample_format='hackrf')
+        d.process_file(capture, collect, start=int(740 / d.block_duration), stop=int(760 / d.block_duration))
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.tempdir)
+
+    def test_edge_wins(self):
+        self.assertEqual(len(self.preambles), 1)
+        signal, preamble_length, direction = self.preambles[0]
+        search = complex_sync_search.ComplexSyncSearch(self.sample_rate)
+        sync_words = search._sync_words[direction][preamble_length]
+
+        offsets = numpy.arange(-(complex_sync_search.F_SEARCH - 1), complex_sync_search.F_SEARCH)
+        _, edge, _ = search.estimate_sync_word_time_freq(signal, sync_words, offsets)
+        self.assertEqual(abs(edge), complex_sync_search.F_SEARCH - 1)
+
+        offsets = {}
+        for freq_search in complex_sync_search.FREQ_SEARCHES:
+            search = complex_sync_search.ComplexSyncSearch(self.sample_rate, freq_search=freq_search)
+            offsets[freq_search], _, _ = search.estimate_sync_word_freq(signal, preamble_length, direction)
+        self.assertIsNotNone(offsets['fminbound'])
+        for freq_search in ('full', 'coarse'):
+            self.assertIsNotNone(offsets[freq_search], freq_search)
+            self.assertLessEqual(abs(offsets[freq_search] - offsets['fminbound']), 2, freq_search)
+
+
+if __name__ == "__main__":
+    unittest.main()
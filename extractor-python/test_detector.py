@@ -0,0 +1,101 @@
+#!/usr/bin/env python
+
+import hashlib
+import os
+import shutil
+import tempfile
+import unittest
+
+import numpy
+
+import chunks
+import detector
+import synthetic
+
+
+class DetectorTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.tempdir = tempfile.mkdtemp()
+        cls.captures = {}
+        cls.captures['hackrf'] = os.path.join(cls.tempdir, 'capture.hackrf')
+        synthetic.capture(cls.captures['hackrf'], seed=1, duration=2.0)
+
+        # The same samples in the other formats, all convert to the same values
+        raw = numpy.fromfile(cls.captures['hackrf'], dtype=numpy.int8)
+        cls.captures['sc16'] = os.path.join(cls.tempdir, 'capture.sc16')
+        (raw.astype(numpy.int16) * 256).tofile(cls.captures['sc16'])
+        cls.captures['float'] = os.path.join(cls.tempdir, 'capture.float')
+        (raw.astype(numpy.float32) / 128).tofile(cls.captures['float'])
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.tempdir)
+
+    def bursts(self, sample_format='hackrf', **kwargs):
+        d = detector.Detector(2000000, sample_format=sample_format, **kwargs)
+        found = []
+        def collect(time_stamp, signal_strength, bin_index, freq, signal):
+            found.append((time_stamp, freq, len(signal), hashlib.md5(signal.tostring()).hexdigest()))
+        d.process_file(self.captures[sample_format], collect)
+        return found
+
+    def test_mmap(self):
+        for search_size in (1, 3):
+            single = self.bursts(search_size=search_size)
+            self.assertTrue(len(single) > 50)
+            self.assertEqual(single, self.bursts(search_size=search_size, use_mmap=True), "search_size=%d" % search_size)
+
+    def test_sample_formats(self):
+        for search_size in (1, 3):
+            single = self.bursts(search_size=search_size)
+            for sample_format in ('sc16', 'float'):
+                for use_mmap in (False, True):
+                    self.assertEqual(single, self.bursts(sample_format, search_size=search_size, use_mmap=use_mmap),
+                            "%s search_size=%d use_mmap=%s" % (sample_format, search_size, use_mmap))
+
+class ChunkTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.tempdir = tempfile.mkdtemp()
+        cls.capture = os.path.join(cls.tempdir, 'capture.hackrf')
+        synthetic.capture(cls.capture, seed=1, duration=6.0)
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.tempdir)
+
+    def unmatched(self, bursts, others):
+        return [(t, f) for t, f in bursts if not any(abs(t - u) <= chunks.DUPLICATE_MS and abs(f - g) <= chunks.DUPLICATE_HZ for u, g in others)]
+
+    def chunked(self, chunk_len, **kwargs):
+        d = detector.Detector(2000000, sample_format='hackrf', **kwargs)
+        whole = []
+        d.process_file(self.capture, lambda time_stamp, signal_strength, bin_index, freq, signal: whole.append((time_stamp, freq)))
+
+        overlap = chunks.OverlapFilter(d.block_duration)
+        chunked = []
+        for start, stop in chunks.split(d.file_blocks(self.capture), chunk_len):
+            found = []
+            def collect(time_stamp, signal_strength, bin_index, freq, signal):
+                found.append((int(round(time_stamp / d.block_duration)), time_stamp, freq))
+            states = {}
+            d.process_file(self.capture, collect, start, stop, min(2 * d.history_blocks, chunk_len), states.__setitem__)
+            chunked += [burst[1:] for burst in overlap.chunk(start, stop, found, states)]
+        return sorted(whole), sorted(chunked), overlap
+
+    def test_chunks(self):
+        for chunk_len in (700, 1000):
+            whole, chunked, overlap = self.chunked(chunk_len)
+            self.assertEqual(whole, chunked, "chunk_len=%d" % chunk_len)
+
+    def test_chunks_inexact(self):
+        # The exponential noise floor never forgets, so chunk borders
+        # can not meet the whole file run and only come close
+        whole, chunked, overlap = self.chunked(1000, noise_floor='exp')
+        self.assertTrue(overlap.inexact > 0)
+        self.assertLessEqual(len(self.unmatched(whole, chunked)), len(whole) / 100)
+        self.assertLessEqual(len(self.unmatched(chunked, whole)), len(whole) / 100)
+
+if __name__ == "__main__":
+    unittest.main()
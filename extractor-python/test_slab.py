@@ -0,0 +1,48 @@
+#!/usr/bin/env python
+
+import multiprocessing
+import os
+import unittest
+
+import numpy
+
+import slab
+
+
+def check(signal):
+    if signal[0] != 1:
+        raise ValueError("bad burst")
+
+class SlabTest(unittest.TestCase):
+    def run_jobs(self, bursts, signals):
+        pool = multiprocessing.Pool(processes=1)
+        for signal in signals:
+            bursts.submit(pool, check, (), signal)
+        pool.close()
+        pool.join() # Also waits for the callbacks
+        free = 0
+        while bursts.put(numpy.ones(4)) is not None:
+            free += 1
+        return free
+
+    def test_release(self):
+        bursts = slab.BurstSlab(2, 16)
+        self.assertEqual(self.run_jobs(bursts, [numpy.ones(4)] * 5), 2)
+
+    def test_failing_job_releases(self):
+        bursts = slab.BurstSlab(2, 16)
+        # The tracebacks of the failing jobs are expected, keep them off the test output
+        stderr = os.dup(2)
+        devnull = os.open(os.devnull, os.O_WRONLY)
+        os.dup2(devnull, 2)
+        try:
+            free = self.run_jobs(bursts, [numpy.zeros(4)] * 5)
+        finally:
+            os.dup2(stderr, 2)
+            os.close(devnull)
+            os.close(stderr)
+        self.assertEqual(free, 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,61 @@
+# vim: set ts=4 sw=4 tw=0 et pm=:
+import threading
+
+class WorkQueue(object):
+    """ Keeps count of the bursts between the detector and the output.
+
+        Every counter has a single writer: the detector thread counts
+        submitted and dropped bursts, the output thread the started and
+        finished ones. Reading an int is atomic, so the depth (submitted -
+        finished) is exact without a lock. Of those, in_flight holds the
+        ones a worker started on, the rest wait for a worker.
+
+        With block set, submit() waits until the depth fell to half of
+        max_len once it got above it (offline processing). Otherwise bursts
+        are dropped from the moment the depth exceeds max_len until it
+        fell below a tenth of it again.
+    """
+    def __init__(self, max_len, block):
+        self._max_len = max_len
+        self._block = block
+        self._dropping = False
+        self._drained = threading.Event()
+
+        self.submitted = 0
+        self.dropped = 0
+        self.finished = 0
+        self.in_flight = {} # worker -> bursts started and not finished
+        self.finished_per_worker = {} # worker -> finished bursts
+
+    def __len__(self):
+        return self.submitted - self.finished
+
+    def submit(self):
+        """ Called by the detector thread for each burst. False if the burst has to be dropped """
+        if self._block:
+            if len(self) > self._max_len:
+                self._drained.clear()
+                while len(self) > self._max_len / 2:
+                    self._drained.wait()
+        else:
+            if len(self) > self._max_len:
+                self._dropping = True
+            if self._dropping and len(self) < self._max_len / 10:
+                self._dropping = False
+            if self._dropping:
+                self.dropped += 1
+                return False
+        self.submitted += 1
+        return True
+
+    def start(self, worker):
+        """ Called by the output thread for each burst a worker started on """
+        self.in_flight[worker] = self.in_flight.get(worker, 0) + 1
+
+    def finish(self, worker):
+        """ Called by the output thread for each burst a worker is done with """
+        self.finished += 1
+        self.in_flight[worker] -= 1
+        self.finished_per_worker[worker] = self.finished_per_worker.get(worker, 0) + 1
+        if len(self) <= self._max_len / 2:
+            self._drained.set()
@@ -0,0 +1,137 @@
+#!/usr/bin/python
+# vim: set ts=4 sw=4 tw=0 et pm=:
+from bitvector import Bits
+
+def _route(src):
+    """ Stages (delta, mask) of a Benes network for len(src) (a power of
+        two) bits, output bit o = input bit src[o], bits by significance.
+        A stage swaps bit j and j+delta for every j set in mask. """
+    n = len(src)
+    if n == 1:
+        return []
+    if n == 2:
+        return [(1, src[0])]
+    half = n // 2
+    inv = [0]*n
+    for o, s in enumerate(src):
+        inv[s] = o
+    # One of each pair of inputs (j, j+half) goes through the lower half
+    # network, the other through the upper one, same for the outputs
+    side = [None]*n
+    for start in xrange(n):
+        s = start
+        while side[s] is None:
+            side[s] = 0
+            side[s ^ half] = 1
+            s = src[inv[s ^ half] ^ half]
+    first = 0
+    last = 0
+    lower = [0]*half
+    upper = [0]*half
+    for j in xrange(half):
+        if side[j]:
+            first |= 1 << j
+        if side[src[j]]:
+            last |= 1 << j
+            lower[j], upper[j] = src[j ^ half] % half, src[j] % half
+        else:
+            lower[j], upper[j] = src[j] % half, src[j ^ half] % half
+    middle = [(delta, low | (high << half)) for (delta, low), (_, high) in zip(_route(lower), _route(upper))]
+    return [(half, first)] + middle + [(half, last)]
+
+def _permute(stages, value):
+    for delta, mask in stages:
+        t = ((value >> delta) ^ value) & mask
+        value ^= t | (t << delta)
+    return value
+
+class Interleaver(object):
+    """ A de-interleaver compiled into a permutation of bit positions.
+
+        positions[i] is the input bit that becomes output bit i, the output
+        of a block is split into parts of the given lengths. The permutation
+        is applied to the int of the bits by a few mask and shift stages.
+        If the block size is a power of two, the stages of all blocks of a
+        frame are applied at once.
+    """
+    def __init__(self, positions, lengths):
+        self.positions = list(positions)
+        self.lengths = tuple(lengths)
+        self.size = len(self.positions)
+        if sorted(self.positions) != range(self.size):
+            raise ValueError("positions are no permutation")
+
+        width = 1
+        while width < self.size:
+            width *= 2
+        src = range(width)
+        for i, p in enumerate(self.positions):
+            src[self.size-1-i] = self.size-1-p
+        self._stages = [(delta, mask) for delta, mask in _route(src) if mask]
+        self._frames = {} # number of blocks -> stages for all of them
+        self._whole_frames = width == self.size
+
+        self._parts = [] # (shift, mask, length) of each part of a block
+        shift = self.size
+        for length in self.lengths:
+            shift -= length
+            self._parts.append((shift, (1 << length) - 1, length))
+
+    def __call__(self, bits):
+        """ The parts of one block """
+        if bits.length != self.size:
+            raise ValueError("block of %d bits, expected %d" % (bits.length, self.size))
+        value = _permute(self._stages, bits.value)
+        return tuple([Bits((value >> shift) & mask, length) for (shift, mask, length) in self._parts])
+
+    def frame(self, bits):
+        """ (output of all complete blocks of bits, the bits after them) """
+        count = len(bits) // self.size if self.size else 0
+        if count == 0:
+            return (Bits(), bits)
+        n = count*self.size
+        value = bits.value >> (bits.length - n)
+        if self._whole_frames:
+            value = _permute(self._frame_stages(count), value)
+        else:
+            # The stages of a block reach into the next one
+            block_mask = (1 << self.size) - 1
+            result = 0
+            for shift in xrange(n - self.size, -1, -self.size):
+                result = (result << self.size) | _permute(self._stages, (value >> shift) & block_mask)
+            value = result
+        return (Bits(value, n), bits[n:])
+
+    def _frame_stages(self, count):
+        if count not in self._frames:
+            blocks = sum(1 << (block*self.size) for block in xrange(count))
+            self._frames[count] = [(delta, mask*blocks) for delta, mask in self._stages]
+        return self._frames[count]
+
+def symbol_positions(n, ways):
+    """ Symbols (bit pairs, swapped) are read backwards, every ways'th one
+        goes to the same output part """
+    symbols = n // 2
+    positions = []
+    lengths = []
+    for part in xrange(ways):
+        start = len(positions)
+        for x in xrange(symbols-1-part, -1, -ways):
+            positions += [2*x+1, 2*x]
+        lengths.append(len(positions)-start)
+    return (positions, lengths)
+
+_symbol_interleavers = {}
+
+def symbols(n, ways):
+    """ Interleaver for blocks of n bits interleaved in ways parts """
+    if (n, ways) not in _symbol_interleavers:
+        _symbol_interleavers[(n, ways)] = Interleaver(*symbol_positions(n, ways))
+    return _symbol_interleavers[(n, ways)]
+
+# The 46 bit link control word: 7 bit frame type, 13 bit + 26 bit code words
+lcw = Interleaver([x-1 for x in
+        [ 40, 39, 36, 35, 32, 31, 28, 27, 24, 23, 20, 19, 16, 15, 12, 11,  8,  7,  4,  3,
+          41,
+          38, 37, 34, 33, 30, 29, 26, 25, 22, 21, 18, 17, 14, 13, 10,  9,  6,  5,  2,  1, 46, 45, 44, 43,
+          42]], (7, 13, 26))
@@ -3,7 +3,10 @@
 import sys
 import re
 import struct
-from bch import ndivide, nrepair, bch_repair
+from bch import nndivide, nnrepair
+from bitvector import Bits
+import interleave
+from iridiumtk.file_time import file_epoch
 from crc import crc24
 import rs
 import rs6
@@ -38,6 +41,8 @@ ringalert_bch_poly=1207
 acch_bch_poly=3545 # 1207 also works?
 hdr_poly=29
 
+raw_line=re.compile('RAW: ([^ ]*) (\d+) (\d+) A:(\w+) [IL]:(\w+) +(\d+)% ([\d.]+) +(\d+) ([\[\]<> 01]+)(.*)')
+
 verbose = False
 perfect = False
 good = False
@@ -65,7 +70,7 @@ for opt, arg in options:
     elif opt in ('--plot'):
         plotargs=arg.split(',')
     elif opt in ('--filter'):
-        linefilter=arg.split(',')
+        linefilter=arg.split(',',1)
     elif opt in ('--voice-dump'):
         vdumpfile=arg
     elif opt in ('-i', '--input'):
@@ -108,8 +113,7 @@ class Message(object):
         self.parse_error=False
         self.error=False
         self.error_msg=[]
-        p=re.compile('RAW: ([^ ]*) (\d+) (\d+) A:(\w+) [IL]:(\w+) +(\d+)% ([\d.]+) +(\d+) ([\[\]<> 01]+)(.*)')
-        m=p.match(line)
+        m=raw_line.match(line)
         if(not m):
             self._new_error("Couldn't parse: "+line)
             self.parse_error=True
@@ -124,31 +128,19 @@ class Message(object):
         self.confidence=int(m.group(6))
         self.level=float(m.group(7))
 #        self.raw_length=m.group(8)
-        self.bitstream_raw=symbol_reverse(re.sub("[\[\]<> ]","",m.group(9))) # raw bitstring with correct symbols
+        self.bitstream_raw=Bits.from_string(m.group(9).translate(None,"[]<> ")).swap_pairs() # raw bits with correct symbols
         self.symbols=len(self.bitstream_raw)/2
         if m.group(10):
             self.extra_data=m.group(10)
             self._new_error("There is crap at the end in extra_data")
         # Make a "global" timestamp
         global tswarning,tsoffset,maxts
-        mm=re.match("(\d\d)-(\d\d)-(20\d\d)T(\d\d)-(\d\d)-(\d\d)-[sr]1",self.filename)
-        if mm:
-            month, day, year, hour, minute, second = map(int, mm.groups())
-            ts=datetime.datetime(year,month,day,hour,minute,second)
-            ts=(ts- datetime.datetime(1970,1,1)).total_seconds()
-            ts+=float(self.timestamp)/1000
-            self.globaltime=ts
-            return
-        mm=re.match("i-(\d+(?:\.\d+)?)-[vbsrtl]1.([a-z])([a-z])",self.filename)
-        if mm:
-            b26=(ord(mm.group(2))-ord('a'))*26+ ord(mm.group(3))-ord('a')
-            self.b26=b26
-            ts=float(mm.group(1))+float(self.timestamp)/1000+b26*600
-            self.globaltime=ts
-            return
-        mm=re.match("i-(\d+(?:\.\d+)?)-[vbsrtl]1(?:-o[+-]\d+)?$",self.filename)
-        if mm:
-            ts=float(mm.group(1))+float(self.timestamp)/1000
+        (epoch,b26)=file_epoch(self.filename)
+        if epoch is not None:
+            ts=epoch+float(self.timestamp)/1000
+            if b26 is not None:
+                self.b26=b26
+                ts+=b26*600
             self.globaltime=ts
             return
         if not tswarning:
@@ -196,7 +188,7 @@ class Message(object):
         elif (bs.startswith(uplink_access)):
             str+=" <U%s>"%uplink_access
             bs=bs[len(uplink_access):]
-        str+=" "+" ".join(slice(bs,16))
+        str+=" "+" ".join(slice(render(bs),16))
         if("extra_data" in self.__dict__):
             str+=" "+self.extra_data
         str+=self._pretty_trailer()
@@ -213,21 +205,21 @@ class IridiumMessage(Message):
         # Try to detect packet type.
         # XXX: will not detect packets with correctable bit errors at the beginning
         if "msgtype" not in self.__dict__:
-            if data[:32] == header_messaging:
+            if data.startswith(header_messaging):
                 self.msgtype="MS"
 
         if "msgtype" not in self.__dict__:
-            if data[:2] =="11" and data[2:96]=="0"*94:
+            if data.startswith("11"+"0"*94):
                 self.msgtype="TL"
 
         if "msgtype" not in self.__dict__:
             hdrlen=6
             blocklen=64
             if len(data)>hdrlen+blocklen:
-                if ndivide(hdr_poly,data[:hdrlen])==0:
+                if nndivide(hdr_poly,data.uint(0,hdrlen))==0:
                     (o_bc1,o_bc2)=de_interleave(data[hdrlen:hdrlen+blocklen])
-                    if ndivide(ringalert_bch_poly,o_bc1[:31])==0:
-                        if ndivide(ringalert_bch_poly,o_bc2[:31])==0:
+                    if nndivide(ringalert_bch_poly,o_bc1.uint(0,31))==0:
+                        if nndivide(ringalert_bch_poly,o_bc2.uint(0,31))==0:
                             self.msgtype="BC"
 
         if "msgtype" not in self.__dict__:
@@ -245,9 +237,9 @@ class IridiumMessage(Message):
             firstlen=3*32
             if len(data)>=3*32:
                 (o_ra1,o_ra2,o_ra3)=de_interleave3(data[:firstlen])
-                if ndivide(ringalert_bch_poly,o_ra1[:31])==0:
-                    if ndivide(ringalert_bch_poly,o_ra2[:31])==0:
-                        if ndivide(ringalert_bch_poly,o_ra3[:31])==0:
+                if nndivide(ringalert_bch_poly,o_ra1.uint(0,31))==0:
+                    if nndivide(ringalert_bch_poly,o_ra2.uint(0,31))==0:
+                        if nndivide(ringalert_bch_poly,o_ra3.uint(0,31))==0:
                             self.msgtype="RA"
 
         if "msgtype" not in self.__dict__:
@@ -259,10 +251,8 @@ class IridiumMessage(Message):
         if self.msgtype=="MS":
             hdrlen=32
             self.header=data[:hdrlen]
-            self.descrambled=[]
-            (blocks,self.descramble_extra)=slice_extra(data[hdrlen:],64)
-            for x in blocks:
-                self.descrambled+=de_interleave(x)
+            (descrambled,self.descramble_extra)=interleave.symbols(64,2).frame(data[hdrlen:])
+            self.descrambled=descrambled.split(32)
         elif self.msgtype=="TL":
             hdrlen=96
             self.header=data[:hdrlen]
@@ -274,24 +264,21 @@ class IridiumMessage(Message):
                 self._new_error("No data to descramble")
             self.header=""
             self.descrambled=de_interleave3(data[:firstlen])
-            (blocks,self.descramble_extra)=slice_extra(data[firstlen:],64)
-            for x in blocks:
-                self.descrambled+=de_interleave(x)
+            (descrambled,self.descramble_extra)=interleave.symbols(64,2).frame(data[firstlen:])
+            self.descrambled+=tuple(descrambled.split(32))
         elif self.msgtype=="BC":
             hdrlen=6
             self.header=data[:hdrlen]
             (e,d,bch)=bch_repair(hdr_poly,self.header)
 
-            self.bc_type = int(d, 2)
+            self.bc_type = int(d)
             if e==0:
                 self.header="bc:%d" % self.bc_type
             else:
                 self.header="%s/E%d"%(self.header,e)
-            self.descrambled=[]
 
-            (blocks,self.descramble_extra)=slice_extra(data[hdrlen:],64)
-            for x in blocks:
-                self.descrambled+=de_interleave(x)
+            (descrambled,self.descramble_extra)=interleave.symbols(64,2).frame(data[hdrlen:])
+            self.descrambled=descrambled.split(32)
         elif self.msgtype=="DA":
             lcwlen=46
             (o_lcw1,o_lcw2,o_lcw3)=de_interleave_lcw(data[:lcwlen])
@@ -300,7 +287,7 @@ class IridiumMessage(Message):
             if e2==1:
                 (e2,self.lcw2,bch)= bch_repair(465,o_lcw2+'1')  # Other bit flip?
             (e3,self.lcw3,bch)= bch_repair( 41,o_lcw3)
-            self.ft=int(self.lcw1,2) # Frame type
+            self.ft=int(self.lcw1) # Frame type
             if e1<0 or e2<0 or e3<0:
 # LCW:=xx[type] yyyy[code]
 # 0: maint
@@ -325,8 +312,8 @@ class IridiumMessage(Message):
                 self.header="LCW(%s %s/%02d E%d,%s %sx/%03d E%d,%s %s/%02d E%d)"%(o_ft[:3],o_ft[3:],ndivide(29,o_ft),e1,o_lcw2[:6],o_lcw2[6:],ndivide(465,o_lcw2+'0'),e2,o_lcw3[:21],o_lcw3[21:],ndivide(41,o_lcw3),e3)
             else:
 #                self.header="LCW(%d,%s,%s E%d)"%(self.ft,self.lcw2,self.lcw3,e1+e2+e3)
-                self.lcw_ft=int(self.lcw2[:2],2)
-                self.lcw_code=int(self.lcw2[2:],2)
+                self.lcw_ft=int(self.lcw2[:2])
+                self.lcw_code=int(self.lcw2[2:])
                 if self.lcw_ft == 0:
                     ty="maint"
                     if self.lcw_code == 6:
@@ -335,16 +322,16 @@ class IridiumMessage(Message):
                         code="<silent>"
                     elif self.lcw_code == 12:
                         code="maint[1]"
-                        code+="[lqi:%d,power:%d]"%(int(self.lcw3[19:21],2),int(self.lcw3[16:19],2))
+                        code+="[lqi:%d,power:%d]"%(self.lcw3.uint(19,21),self.lcw3.uint(16,19))
                     elif self.lcw_code == 0:
                         code="sync"
-                        code+="[status:%d,dtoa:%d,dfoa:%d]"%(int(self.lcw3[1:2],2),int(self.lcw3[3:13],2),int(self.lcw3[13:21],2))
+                        code+="[status:%d,dtoa:%d,dfoa:%d]"%(self.lcw3.uint(1,2),self.lcw3.uint(3,13),self.lcw3.uint(13,21))
                     elif self.lcw_code == 3:
                         code="maint[2]"
-                        code+="[lqi:%d,power:%d,f_dtoa:%d,f_dfoa:%d]"%(int(self.lcw3[1:3],2),int(self.lcw3[3:6],2),int(self.lcw3[6:13],2),int(self.lcw3[13:20],2))
+                        code+="[lqi:%d,power:%d,f_dtoa:%d,f_dfoa:%d]"%(self.lcw3.uint(1,3),self.lcw3.uint(3,6),self.lcw3.uint(6,13),self.lcw3.uint(13,20))
                     elif self.lcw_code == 1:
                         code="switch"
-                        code+="[dtoa:%d,dfoa:%d]"%(int(self.lcw3[3:13],2),int(self.lcw3[13:21],2))
+                        code+="[dtoa:%d,dfoa:%d]"%(self.lcw3.uint(3,13),self.lcw3.uint(13,21))
                     else:
                         code="rsrvd"
                 elif self.lcw_ft == 1:
@@ -359,7 +346,7 @@ class IridiumMessage(Message):
                         code="handoff_cand"
                     elif self.lcw_code == 3:
                         code="handoff_resp"
-                        code+="[cand:%d,denied:%d,ref:%d,slot:%d,sband_up:%d,sband_dn:%d,access:%d]"%(int(self.lcw3[2:3],2),int(self.lcw3[3:4],2),int(self.lcw3[4:5],2),1+int(self.lcw3[6:8],2),int(self.lcw3[8:13],2),int(self.lcw3[13:18],2),1+int(self.lcw3[18:21],2))
+                        code+="[cand:%d,denied:%d,ref:%d,slot:%d,sband_up:%d,sband_dn:%d,access:%d]"%(self.lcw3.uint(2,3),self.lcw3.uint(3,4),self.lcw3.uint(4,5),1+self.lcw3.uint(6,8),self.lcw3.uint(8,13),self.lcw3.uint(13,18),1+self.lcw3.uint(18,21))
                     elif self.lcw_code == 15:
                         code="<silent>"
                     else:
@@ -367,7 +354,7 @@ class IridiumMessage(Message):
                 elif self.lcw_ft == 3:
                     ty="rsrvd"
                     code="<>"
-                self.header="LCW(%d,T:%s,C:%s(%s),%s E%d)"%(self.ft,ty,code,int(self.lcw2,2),int(self.lcw3,2),e1+e2+e3)
+                self.header="LCW(%d,T:%s,C:%s(%s),%s E%d)"%(self.ft,ty,code,int(self.lcw2),int(self.lcw3),e1+e2+e3)
                 self.header="%-110s "%self.header
             self.descrambled=[]
             self.payload_r=[]
@@ -380,8 +367,8 @@ class IridiumMessage(Message):
                 self.msgtype="VO"
                 for x in slice(data[:312],8):
                     self.descrambled+=[x]
-                    self.payload_f+=[int(x,2)]
-                    self.payload_r+=[int(x[::-1],2)]
+                    self.payload_f+=[int(x)]
+                    self.payload_r+=[int(x[::-1])]
                 self.descramble_extra=data[312:]
             elif self.ft==1: # IP via PPP
                 self.msgtype="IP"
@@ -402,12 +389,12 @@ class IridiumMessage(Message):
             elif self.ft==7: # Synchronisation
                 self.msgtype="SY"
                 self.descrambled=data[:312]
-                self.sync=[int(x,2) for x in slice(self.descrambled, 8)]
+                self.sync=[int(x) for x in slice(self.descrambled, 8)]
                 self.descramble_extra=data[312:]
             elif self.ft==3: # Unknown data
                 self.msgtype="U3"
                 self.descrambled=data[:312]
-                self.payload=[int(x,2) for x in slice(self.descrambled, 6)]
+                self.payload=[int(x) for x in slice(self.descrambled, 6)]
                 self.descramble_extra=data[312:]
             else: # Need to check what other ft are
                 self.msgtype="UK"
@@ -447,19 +434,19 @@ class IridiumMessage(Message):
         else:
              str+=" DL"
         if self.header:
-            str+=" "+self.header
+            str+=" %s"%self.header
         return str
     def _pretty_trailer(self):
         str= super(IridiumMessage,self)._pretty_trailer()
         if self.descramble_extra != "":
-            str+= " descr_extra:"+re.sub(iridium_lead_out,"["+iridium_lead_out+"]",self.descramble_extra)
+            str+= " descr_extra:"+re.sub(iridium_lead_out,"["+iridium_lead_out+"]",render(self.descramble_extra))
         return str
     def pretty(self):
         sstr= "IRI: "+self._pretty_header()
         sstr+= " %2s"%self.msgtype
         if self.descrambled!="":
             sstr+= " ["
-            sstr+=".".join(["%02x"%int("0"+x,2) for x in slice("".join(self.descrambled), 8) ])
+            sstr+=".".join(["%02x"%int("0"+x,2) for x in slice(render(self.descrambled), 8) ])
             sstr+="]"
         sstr+= self._pretty_trailer()
         return sstr
@@ -498,9 +485,9 @@ class IridiumSTLMessage(IridiumMessage):
         return super(IridiumSTLMessage,self)._pretty_trailer()
     def pretty(self):
         str= "ITL: "+self._pretty_header()
-        str+=" ["+".".join(["%02x"%int("0"+x,2) for x in slice("".join(self.descrambled[:256]), 8) ])+"]"
-        str+=" ["+".".join(["%02x"%int("0"+x,2) for x in slice("".join(self.descrambled[256:512]), 8) ])+"]"
-        str+=" ["+".".join(["%02x"%int("0"+x,2) for x in slice("".join(self.descrambled[512:]), 8) ])+"]"
+        str+=" ["+".".join(["%02x"%int("0"+x,2) for x in slice(render(self.descrambled[:256]), 8) ])+"]"
+        str+=" ["+".".join(["%02x"%int("0"+x,2) for x in slice(render(self.descrambled[256:512]), 8) ])+"]"
+        str+=" ["+".".join(["%02x"%int("0"+x,2) for x in slice(render(self.descrambled[512:]), 8) ])+"]"
         str+=self._pretty_trailer()
         return str
 
@@ -625,7 +612,7 @@ class IridiumVOMessage(IridiumMessage):
 class IridiumIPMessage(IridiumMessage):
     def __init__(self,imsg):
         self.__dict__=imsg.__dict__
-        self.payload_f=[int(x[::-1],2) for x in self.descrambled]
+        self.payload_f=[int(x[::-1]) for x in self.descrambled]
         (ok,msg,rsc)=rs.rs_fix(self.payload_f)
         if ok:
             self.itype="IIQ"
@@ -650,18 +637,18 @@ class IridiumIPMessage(IridiumMessage):
                self.itype="IIR"
                self.idata=self.idata[0:-2]
         else:
-            self.crcval=crc24(bytearray([int(x,2) for x in self.descrambled]))
+            self.crcval=crc24(bytearray([int(x) for x in self.descrambled]))
             if self.crcval==0:
                 self.itype="IIP"
                 self.ip_hdr=self.descrambled[0]
-                self.ip_ctr1=int(self.descrambled[1],2)
+                self.ip_ctr1=int(self.descrambled[1])
                 self.ip_uk1=self.descrambled[2]
-                self.ip_ctr2=int(self.descrambled[3],2)
-                self.ip_len= int(self.descrambled[4],2)
+                self.ip_ctr2=int(self.descrambled[3])
+                self.ip_len= int(self.descrambled[4])
                 if self.ip_len>31:
                     #self._new_error("Invalid ip_len")
                     pass
-                self.ip_data=[int(x,2) for x in self.descrambled[5:31+5]] # XXX: only len bytes?
+                self.ip_data=[int(x) for x in self.descrambled[5:31+5]] # XXX: only len bytes?
                 self.ip_cksum= self.descrambled[31+5:]
             else:
                 self.itype="IIU"
@@ -676,7 +663,7 @@ class IridiumIPMessage(IridiumMessage):
         if self.itype=="IIP":
             s+= " %s c1=%03d %s c2=%03d len=%03d"%(self.ip_hdr,self.ip_ctr1,self.ip_uk1,self.ip_ctr2,self.ip_len)
             s+= " ["+".".join(["%02x"%x for x in self.ip_data])+"]"
-            s+= " %06x/%06x"%(int("".join(self.ip_cksum),2),self.crcval)
+            s+= " %06x/%06x"%(int(Bits.join(self.ip_cksum)),self.crcval)
             s+=" FCS:OK"
             ip_data = ' IP: '
             for c in self.ip_data:
@@ -711,31 +698,40 @@ class IridiumECCMessage(IridiumMessage):
             self.poly=acch_bch_poly
         else:
             raise ParserError("unknown Iridium message type(canthappen)")
-        self.bitstream_messaging=""
-        self.bitstream_bch=""
-        self.oddbits=""
+        bchlen=self.poly.bit_length()-1
+        datalen=31-bchlen
+        bitstream_bch=0
+        bitstream_messaging=0
+        oddbits=0
+        nblocks=0
         self.fixederrs=0
         for block in self.descrambled:
-            if len(block)!=32 and len(block)!=31:
-                raise ParserError("unknown BCH block len:%d"%len(block))
-            if len(block)==32:
-                bits=block[:31]
-            else:
-                bits=block
-            (errs,data,bch)=bch_repair(self.poly, bits)
+            blocklen=len(block)
+            if blocklen!=32 and blocklen!=31:
+                raise ParserError("unknown BCH block len:%d"%blocklen)
+            value=int(block)
+            bits=value
+            if blocklen==32:
+                bits>>=1
+            (errs,bits)=nnrepair(self.poly,bits,31)
             if errs>0:
                 self.fixederrs+=1
             if(errs<0):
-                if len(self.bitstream_bch) == 0:
+                if nblocks == 0:
                     self._new_error("BCH decode failed")
                 break
-            parity=(data+bch).count('1') % 2
-            if len(block)==32:
-                parity=(int(block[31])+parity)%2
+            parity=bin(bits).count('1') % 2
+            if blocklen==32:
+                parity=(value&1)^parity
                 #if parity==1: raise ParserError("Parity error")
-            self.bitstream_bch+=data
-            self.bitstream_messaging+=data[1:]
-            self.oddbits+=data[0]
+            data=bits>>bchlen
+            bitstream_bch=(bitstream_bch<<datalen)|data
+            bitstream_messaging=(bitstream_messaging<<(datalen-1))|(data&((1<<(datalen-1))-1))
+            oddbits=(oddbits<<1)|(data>>(datalen-1))
+            nblocks+=1
+        self.bitstream_bch=Bits(bitstream_bch,nblocks*datalen)
+        self.bitstream_messaging=Bits(bitstream_messaging,nblocks*(datalen-1))
+        self.oddbits=Bits(oddbits,nblocks)
         if len(self.bitstream_bch)==0:
             self._new_error("No data to descramble")
     def upgrade(self):
@@ -785,10 +781,10 @@ class IridiumDAMessage(IridiumECCMessage):
         # Decode stuff from self.bitstream_bch
         self.flags1=self.bitstream_bch[:4]
         self.flag1b=self.bitstream_bch[4:5]
-        self.da_ctr=int(self.bitstream_bch[5:8],2)
+        self.da_ctr=self.bitstream_bch.uint(5,8)
         self.flags2=self.bitstream_bch[8:12]
         self.flags3=self.bitstream_bch[12:16]
-        self.zero1=int(self.bitstream_bch[16:20],2)
+        self.zero1=self.bitstream_bch.uint(16,20)
         if self.zero1 != 0:
             self._new_error("zero1 not 0")
 
@@ -806,25 +802,25 @@ class IridiumDAMessage(IridiumECCMessage):
         if len(self.bitstream_bch) < 9*20+16:
             raise ParserError("Not enough data in data packet")
 
-        self.da_len=int(self.bitstream_bch[11:16],2)
+        self.da_len=self.bitstream_bch.uint(11,16)
         if self.da_len>0:
-            self.da_crc=int(self.bitstream_bch[9*20:9*20+16],2)
-            self.da_ta=[int(x,2) for x in slice(self.bitstream_bch[20:9*20],8)]
+            self.da_crc=self.bitstream_bch.uint(9*20,9*20+16)
+            self.da_ta=[int(x) for x in slice(self.bitstream_bch[20:9*20],8)]
             crcstream=self.bitstream_bch[:16]+"0"*12+self.bitstream_bch[16:]
-            the_crc=crc16("".join([chr(int(x,2)) for x in crcstream]))
+            the_crc=crc16("".join([chr(int(x,2)) for x in str(crcstream)]))
             self.the_crc=the_crc
             self.crc_ok=(the_crc==0)
         else:
-            self.da_ta=[int(x,2) for x in slice(self.bitstream_bch[20:11*20],8)]
+            self.da_ta=[int(x) for x in slice(self.bitstream_bch[20:11*20],8)]
 
-        self.zero2=int(self.bitstream_bch[9*20+16:],2)
+        self.zero2=int(self.bitstream_bch[9*20+16:])
         if self.zero2 != 0:
             self._new_error("zero2 not 0")
 
         sbd= self.bitstream_bch[1*20:9*20]
         self.data=[]
         for x in slice(sbd, 8):
-            self.data+=[int(x,2)]
+            self.data+=[int(x)]
 
     def upgrade(self):
         if self.error: return self
@@ -840,12 +836,12 @@ class IridiumDAMessage(IridiumECCMessage):
         return super(IridiumDAMessage,self)._pretty_trailer()
     def pretty(self):
         str= "IDA: "+self._pretty_header()
-        str+= " "+self.bitstream_bch[:4]
-        str+= " "+self.bitstream_bch[4:5]
-        str+= " ctr="+self.bitstream_bch[5:8]
-        str+= " "+self.bitstream_bch[8:11]
+        str+= " %s"%self.bitstream_bch[:4]
+        str+= " %s"%self.bitstream_bch[4:5]
+        str+= " ctr=%s"%self.bitstream_bch[5:8]
+        str+= " %s"%self.bitstream_bch[8:11]
         str+= " len=%02d"%self.da_len
-        str+= " 0:"+self.bitstream_bch[16:20]
+        str+= " 0:%s"%self.bitstream_bch[16:20]
         str+=" ["
         if self.da_len>0:
             if all([x==0 for x in self.da_ta[self.da_len+1:]]):
@@ -859,23 +855,23 @@ class IridiumDAMessage(IridiumECCMessage):
         str+= "%-60s"%(mstr+"]")
 
         if self.da_len>0:
-            str+= " %04x"%int(self.bitstream_bch[9*20:9*20+16],2)
+            str+= " %04x"%self.bitstream_bch.uint(9*20,9*20+16)
             str+="/%04x"%self.the_crc
             if self.crc_ok:
                 str+=" CRC:OK"
             else:
                 str+=" CRC:no"
-            str+= " "+self.bitstream_bch[9*20+16:]
+            str+= " %s"%self.bitstream_bch[9*20+16:]
         else:
             str+="  ---   "
-            str+= " "+self.bitstream_bch[9*20+16:]
+            str+= " %s"%self.bitstream_bch[9*20+16:]
 
         if self.da_len>0:
             sbd= self.bitstream_bch[1*20:9*20]
 
             str+=' SBD: '
             for x in slice(sbd, 8):
-                c=int(x,2)
+                c=int(x)
                 if( c>=32 and c<127):
                     str+=chr(c)
                 else:
@@ -894,14 +890,14 @@ class IridiumBCMessage(IridiumECCMessage):
             data1 = blocks[0]
             data2 = blocks[1]
 
-            self.sv_id = int(data1[0:7], 2)
-            self.beam_id = int(data1[7:13], 2)
+            self.sv_id = data1.uint(0,7)
+            self.beam_id = data1.uint(7,13)
             self.unknown01 = data1[13:14]
-            self.timeslot = int(data1[14:15], 2)
-            self.sv_blocking = int(data1[15:16], 2)
+            self.timeslot = data1.uint(14,15)
+            self.sv_blocking = data1.uint(15,16)
             self.acqu_classes = data1[16:21] + data2[0:11]
-            self.acqu_subband = int(data2[11:16], 2)
-            self.acqu_channels = int(data2[16:19], 2)
+            self.acqu_subband = data2.uint(11,16)
+            self.acqu_channels = data2.uint(16,19)
             self.unknown02 = data2[19:21]
 
             self.readable += 'sat:%02d cell:%02d %s ts:%d sv_blkn:%d aq_cl:%s aq_sb:%02d aq_ch:%d %s' % (self.sv_id, self.beam_id, self.unknown01, self.timeslot, self.sv_blocking, self.acqu_classes, self.acqu_subband, self.acqu_channels, self.unknown02)
@@ -912,14 +908,14 @@ class IridiumBCMessage(IridiumECCMessage):
             data1 = blocks[0]
             data2 = blocks[1]
 
-            self.type = int(data1[0:6], 2)
+            self.type = data1.uint(0,6)
             if self.type == 0:
                 self.unknown11 = data1[6:21] + data2[0:15]
-                self.max_uplink_pwr = int(data2[15:21], 2)
+                self.max_uplink_pwr = data2.uint(15,21)
                 self.readable += ' %s max_uplink_pwr:%02d' % (self.unknown11, self.max_uplink_pwr)
             elif self.type == 1:
                 self.unknown21 = data1[6:10]
-                self.time = int(data1[10:21]+data2[0:21], 2)
+                self.time = int(data1[10:21]+data2[0:21])
                 # Different Iridium epochs that we know about:
                 # 2014-05-11T14:23:55Z : 1399818235 current one
                 # 2007-03-08T03:50:21Z : 1173325821
@@ -927,7 +923,7 @@ class IridiumBCMessage(IridiumECCMessage):
                 self.readable += ' %s time:%sZ' % (self.unknown21, datetime.datetime.fromtimestamp(self.time*90/1000+1399818235,tz=Z).strftime("%Y-%m-%dT%H:%M:%S"))
             elif self.type == 2:
                 self.unknown31 = data1[6:10]
-                self.tmsi_expiry = int(data1[10:21] + data2[0:21], 2)
+                self.tmsi_expiry = int(data1[10:21] + data2[0:21])
                 self.readable += ' %s tmsi_expiry:%02d' % (self.unknown31, self.tmsi_expiry)
             elif self.type == 4:
                 if data1+data2 != "000100000000100001110000110000110011110000":
@@ -943,12 +939,12 @@ class IridiumBCMessage(IridiumECCMessage):
                 # Channel Assignment
                 unknown1 = data1[0:3]
                 unknown2 = data1[3:11]
-                timeslot = int(data1[11:13], 2)
-                uplink_subband = int(data1[13:18], 2)
-                downlink_subband = int(data1[18:21] + data2[0:2], 2)
+                timeslot = data1.uint(11,13)
+                uplink_subband = data1.uint(13,18)
+                downlink_subband = int(data1[18:21] + data2[0:2])
                 unknown3 = data2[2:5]
-                dtoa = int(data2[5:13], 2)
-                dfoa = int(data2[13:19], 2)
+                dtoa = data2.uint(5,13)
+                dfoa = data2.uint(13,19)
                 unknown4 = data2[19:21]
                 result = ' %s %s ts:%d ul_sb:%02d dl_sb:%02d %s dtoa:%03d dfoa:%02d %s' % (unknown1, unknown2, timeslot, uplink_subband, downlink_subband, unknown3, dtoa, dfoa, unknown4)
             return result
@@ -982,15 +978,15 @@ class IridiumRAMessage(IridiumECCMessage):
         # Decode stuff from self.bitstream_bch
         if len(self.bitstream_bch)<64:
             raise ParserError("RA content too short")
-        self.ra_sat=   int(self.bitstream_bch[0:7],2)   # sv_id
-        self.ra_cell=  int(self.bitstream_bch[7:13],2)  # beam_id
-        self.ra_pos_x= int(self.bitstream_bch[14:25],2) - int(self.bitstream_bch[13])*(1<<11)
-        self.ra_pos_y= int(self.bitstream_bch[26:37],2) - int(self.bitstream_bch[25])*(1<<11)
-        self.ra_pos_z= int(self.bitstream_bch[38:49],2) - int(self.bitstream_bch[37])*(1<<11)
-        self.ra_int=   int(self.bitstream_bch[49:56],2) # 90ms interval of RA (within same sat/cell)
-        self.ra_ts=    int(self.bitstream_bch[56:57],2) # Broadcast slot 1 or 4
-        self.ra_eip=   int(self.bitstream_bch[57:58],2) # EPI ?
-        self.ra_bc_sb= int(self.bitstream_bch[58:63],2) # BCH downlink sub-band
+        self.ra_sat=   self.bitstream_bch.uint(0,7)   # sv_id
+        self.ra_cell=  self.bitstream_bch.uint(7,13)  # beam_id
+        self.ra_pos_x= self.bitstream_bch.uint(14,25) - int(self.bitstream_bch[13])*(1<<11)
+        self.ra_pos_y= self.bitstream_bch.uint(26,37) - int(self.bitstream_bch[25])*(1<<11)
+        self.ra_pos_z= self.bitstream_bch.uint(38,49) - int(self.bitstream_bch[37])*(1<<11)
+        self.ra_int=   self.bitstream_bch.uint(49,56) # 90ms interval of RA (within same sat/cell)
+        self.ra_ts=    self.bitstream_bch.uint(56,57) # Broadcast slot 1 or 4
+        self.ra_eip=   self.bitstream_bch.uint(57,58) # EPI ?
+        self.ra_bc_sb= self.bitstream_bch.uint(58,63) # BCH downlink sub-band
 
         self.ra_lat = atan2(self.ra_pos_z,sqrt(self.ra_pos_x**2+self.ra_pos_y**2))*180/pi
         self.ra_lon = atan2(self.ra_pos_y,self.ra_pos_x)*180/pi
@@ -1000,10 +996,10 @@ class IridiumRAMessage(IridiumECCMessage):
         self.paging=[]
         while len(ra_msg)>=42:
             paging={
-                'tmsi':  int(ra_msg[ 0:32],2),
-                'zero1': int(ra_msg[32:34],2),
-                'msc_id':int(ra_msg[34:39],2),
-                'zero2': int(ra_msg[39:42],2),
+                'tmsi':  ra_msg.uint(0,32),
+                'zero1': ra_msg.uint(32,34),
+                'msc_id':ra_msg.uint(34,39),
+                'zero2': ra_msg.uint(39,42),
             }
             if ra_msg[:42]=="111111111111111111111111111111111111111111":
                 paging['none']=True
@@ -1049,7 +1045,7 @@ class IridiumRAMessage(IridiumECCMessage):
             str+= ")"
 
         if self.ra_extra:
-            str+= " +%s"%" ".join(slice(self.ra_extra,21))
+            str+= " +%s"%" ".join(slice(render(self.ra_extra),21))
 
         str+=self._pretty_trailer()
         return str
@@ -1066,18 +1062,18 @@ class IridiumMSMessage(IridiumECCMessage):
         if self.zero1 != '0000':
             self._new_error("zero1 not 0000")
 
-        self.block = int(rest[4:4+4], 2)        # Block number in the super frame
-        self.frame = int(rest[8:8+6], 2)        # Current frame number (OR: Current cell number)
-        self.bch_blocks = int(rest[14:18], 2)   # Number of BCH blocks in this message
+        self.block = rest.uint(4,4+4)        # Block number in the super frame
+        self.frame = rest.uint(8,8+6)        # Current frame number (OR: Current cell number)
+        self.bch_blocks = rest.uint(14,18)   # Number of BCH blocks in this message
         self.unknown1=rest[18]                  # ?
         self.secondary = int(rest[19])          # Something like secondary SV
-        self.ctr1=int(rest[19]+self.oddbits[1]+rest[20:32],2)
+        self.ctr1=int(rest[19]+self.oddbits[1]+rest[20:32])
 
         if(self.oddbits[0]=="1"):
             self.group="A"
             self.agroup=0
         else:
-            self.group=int(rest[18:20],2)
+            self.group=rest.uint(18,20)
             self.agroup=1+self.group
         self.tdiff=((self.block*5+self.agroup)*48+self.frame)*90
 
@@ -1112,8 +1108,8 @@ class IridiumMSMessage(IridiumECCMessage):
             rest=rest[20:]
         # If enough  bits are left, there will be a pager message
         if len(rest)>20:
-            self.msg_ric=int(rest[0:22][::-1],2)
-            self.msg_format=int(rest[22:27],2)
+            self.msg_ric=int(rest[0:22][::-1])
+            self.msg_format=rest.uint(22,27)
             self.msg_data=rest[27:]
     def upgrade(self):
         if self.error: return self
@@ -1155,20 +1151,20 @@ class IridiumMessagingAscii(IridiumMSMessage):
     def __init__(self,immsg):
         self.__dict__=immsg.__dict__
         rest=self.msg_data
-        self.msg_seq=int(rest[0:6],2) # 0-61 (62/63 seem unused)
-        self.msg_zero1=int(rest[6:10],2)
+        self.msg_seq=rest.uint(0,6) # 0-61 (62/63 seem unused)
+        self.msg_zero1=rest.uint(6,10)
         if(self.msg_zero1 != 0):
             self._new_error("zero1 is not all-zero")
         self.msg_unknown1=rest[10:20]
         self.msg_len_bit=rest[20]
         rest=rest[21:]
         if(self.msg_len_bit=="1"):
-            lfl=int(rest[0:4],2)
+            lfl=rest.uint(0,4)
             self.msg_len_field_len=lfl
             if(lfl == 0):
                 raise ParserError("len_field_len unexpectedly 0")
-            self.msg_ctr=    int(rest[4:4+lfl],2)
-            self.msg_ctr_max=int(rest[4+lfl:4+lfl*2],2)
+            self.msg_ctr=    rest.uint(4,4+lfl)
+            self.msg_ctr_max=rest.uint(4+lfl,4+lfl*2)
             rest=rest[4+lfl*2:]
             if(lfl<1 or lfl>2):
                 self._new_error("len_field_len not 1 or 2")
@@ -1179,9 +1175,9 @@ class IridiumMessagingAscii(IridiumMSMessage):
         self.msg_zero2=rest[0]
         if(self.msg_zero2 != "0"):
             self._new_error("zero2 is not zero")
-        self.msg_checksum=int(rest[1:8],2)
+        self.msg_checksum=rest.uint(1,8)
         self.msg_msgdata=rest[8:]
-        m=re.compile('(\d{7})').findall(self.msg_msgdata)
+        m=re.compile('(\d{7})').findall(str(self.msg_msgdata))
         self.msg_ascii=""
         end=0
         for (group) in m:
@@ -1217,8 +1213,8 @@ class IridiumMessagingUnknown(IridiumMSMessage):
     def __init__(self,immsg):
         self.__dict__=immsg.__dict__
         rest=self.msg_data
-        self.msg_seq=int(rest[0:6],2)
-        self.msg_zero1=int(rest[6:10],2)
+        self.msg_seq=rest.uint(0,6)
+        self.msg_zero1=rest.uint(6,10)
         if(self.msg_zero1 != 0):
             self._new_error("zero1 is not all-zero")
         self.msg_unknown1=rest[10:20]
@@ -1243,34 +1239,40 @@ def grouped(iterable, n):
     "s -> (s0,s1,s2,...sn-1), (sn,sn+1,sn+2,...s2n-1), ..."
     return izip(*[iter(iterable)]*n)
 
-def symbol_reverse(bits):
-    r = ''
-    for x in xrange(0,len(bits)-1,2):
-        r += bits[x+1] + bits[x+0]
-    return r
+def ndivide(poly,bits):
+    return nndivide(poly,int(bits))
+
+def nrepair(poly,bits):
+    (errs,repaired)=nnrepair(poly,int(bits),len(bits))
+    return (errs,Bits(repaired,len(bits)))
+
+def bch_repair(poly,bits):
+    (errs,repaired)=nnrepair(poly,int(bits),len(bits))
+    n=poly.bit_length()-1
+    return (errs,Bits(repaired>>n,len(bits)-n),Bits(repaired&((1<<n)-1),n))
+
+def render(bits): # string of bits or of a list of them
+    if isinstance(bits,Bits):
+        return str(bits)
+    return "".join([str(x) for x in bits])
+
+def as_strings(q): # copy of q with the bits as strings, like --filter expressions expect them
+    s=copy.copy(q)
+    for (k,v) in s.__dict__.items():
+        if isinstance(v,Bits):
+            s.__dict__[k]=str(v)
+        elif isinstance(v,(list,tuple)) and v and isinstance(v[0],Bits):
+            s.__dict__[k]=type(v)([str(x) for x in v])
+    return s
 
 def de_interleave(group):
-#    symbols = [''.join(symbol) for symbol in grouped(group, 2)]
-    symbols = [group[z+1]+group[z] for z in xrange(0,len(group),2)]
-    even = ''.join([symbols[x] for x in range(len(symbols)-2,-1, -2)])
-    odd  = ''.join([symbols[x] for x in range(len(symbols)-1,-1, -2)])
-    return (odd,even)
+    return interleave.symbols(len(group),2)(group)
 
 def de_interleave3(group):
-#    symbols = [''.join(symbol) for symbol in grouped(group, 2)]
-    symbols = [group[z+1]+group[z] for z in xrange(0,len(group),2)]
-    third  = ''.join([symbols[x] for x in range(len(symbols)-3, -1, -3)])
-    second = ''.join([symbols[x] for x in range(len(symbols)-2, -1, -3)])
-    first  = ''.join([symbols[x] for x in range(len(symbols)-1, -1, -3)])
-    return (first,second,third)
+    return interleave.symbols(len(group),3)(group)
 
 def de_interleave_lcw(bits):
-    tbl= [ 40, 39, 36, 35, 32, 31, 28, 27, 24, 23, 20, 19, 16, 15, 12, 11,  8,  7,  4,  3,
-           41,
-           38, 37, 34, 33, 30, 29, 26, 25, 22, 21, 18, 17, 14, 13, 10,  9,  6,  5,  2,  1, 46, 45, 44, 43,
-           42]
-    lcw=[bits[x-1:x] for x in tbl]
-    return (''.join(lcw[:7]),''.join(lcw[7:20]),''.join(lcw[20:]))
+    return interleave.lcw(bits)
 
 def messagechecksum(msg):
     csum=0
@@ -1279,15 +1281,20 @@ def messagechecksum(msg):
     return (~csum)%128
 
 def group(string,n): # similar to grouped, but keeps rest at the end
-    string=re.sub('(.{%d})'%n,'\\1 ',string)
+    string=re.sub('(.{%d})'%n,'\\1 ',str(string))
     return string.rstrip()
 
 def slice_extra(string,n):
-    blocks=[string[x:x+n] for x in xrange(0,len(string)+1,n)]
-    extra=blocks.pop()
+    blocks=slice(string,n)
+    if blocks and len(blocks[-1])<n:
+        extra=blocks.pop()
+    else:
+        extra=string[len(string):]
     return (blocks,extra)
 
 def slice(string,n):
+    if isinstance(string,Bits):
+        return string.split(n)
     return [string[x:x+n] for x in xrange(0,len(string),n)]
 
 if output == "dump":
@@ -1332,7 +1339,7 @@ def perline(q):
         if linefilter[0]!="All" and type(q).__name__ != linefilter[0]:
             return
         if len(linefilter)>1:
-            if not eval(linefilter[1]):
+            if not eval(linefilter[1],globals(),{'q':as_strings(q)}):
                 return
     if vdumpfile != None and type(q).__name__ == "IridiumVOMessage":
         if len(q.voice)!=312:
@@ -0,0 +1,64 @@
+#!/usr/bin/env python
+# vim: set ts=4 sw=4 tw=0 et pm=:
+
+# Start times encoded in the names of recordings. Shared with the
+# (python 2) iridium-parser.py, so this has to stay python 2 compatible.
+from collections import OrderedDict
+from datetime import datetime
+import re
+
+
+DATE_NAME = re.compile(r'(\d\d)-(\d\d)-(20\d\d)T(\d\d)-(\d\d)-(\d\d)-[sr]1')
+SPLIT_NAME = re.compile(r'i-(\d+(?:\.\d+)?)-[vbsrtl]1.([a-z])([a-z])')
+EPOCH_NAME = re.compile(r'i-(\d+(?:\.\d+)?)-[vbsrtl]1(?:-o[+-]\d+)?$')
+
+CACHE_SIZE = 64
+
+_cache = OrderedDict()
+
+
+def parse_file_epoch(filename):
+    """(start of the recording in seconds since the epoch, b26) for filename.
+
+    b26 is the number of the 10 minute part of a split recording (.aa, .ab, ...)
+    and None for other files, (None, None) if filename carries no timestamp.
+    """
+    mm = DATE_NAME.match(filename)
+    if mm:
+        month, day, year, hour, minute, second = map(int, mm.groups())
+        epoch = datetime(year, month, day, hour, minute, second)
+        return ((epoch - datetime(1970, 1, 1)).total_seconds(), None)
+
+    mm = SPLIT_NAME.match(filename)
+    if mm:
+        b26 = (ord(mm.group(2)) - ord('a')) * 26 + ord(mm.group(3)) - ord('a')
+        return (float(mm.group(1)), b26)
+
+    mm = EPOCH_NAME.match(filename)
+    if mm:
+        return (float(mm.group(1)), None)
+
+    return (None, None)
+
+
+def file_epoch(filename):
+    """parse_file_epoch(filename), remembered for the last CACHE_SIZE filenames"""
+    try:
+        result = _cache.pop(filename)
+    except KeyError:
+        result = parse_file_epoch(filename)
+        if len(_cache) >= CACHE_SIZE:
+            _cache.popitem(last=False)
+    _cache[filename] = result
+    return result
+
+
+def file_time(filename, ms):
+    """Seconds since the epoch of a frame ms milliseconds into filename, None if unknown"""
+    epoch, b26 = file_epoch(filename)
+    if epoch is None:
+        return None
+    timestamp = epoch + float(ms) / 1000
+    if b26 is not None:
+        timestamp += b26 * 600
+    return timestamp
@@ -8,7 +8,6 @@ from collections import namedtuple
 from datetime import datetime
 import fileinput
 import logging
-import re
 import sys
 
 
@@ -19,6 +18,9 @@ except ImportError:
     print('Failed to import matplotlib. This prevents any GUI.', file=sys.stderr)
 
 
+from .file_time import file_time
+
+
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
@@ -32,26 +34,10 @@ HIST_DIMENSIONS = {
 
 
 def extract_timestamp(filename, dt):
-    mm = re.match(r'i-(\d+(?:\.\d+)?)-[vbsrtl]1.([a-z])([a-z])', filename)
-    if mm:
-        b26 = (ord(mm.group(2)) - ord('a')) * 26 + ord(mm.group(3)) - ord('a')
-        timestamp = float(mm.group(1)) + float(dt) / 1000 + b26 * 600
-        return timestamp
-
-    mm = re.match(r'i-(\d+(?:\.\d+)?)-[vbsrtl]1(?:-o[+-]\d+)?$', filename)
-    if mm:
-        timestamp = float(mm.group(1)) + float(dt) / 1000
-        return timestamp
-
-    mm = re.match(r'(\d\d)-(\d\d)-(20\d\d)T(\d\d)-(\d\d)-(\d\d)-[sr]1', filename)
-    if mm:
-        month, day, year, hour, minute, second = map(int, mm.groups())
-        timestamp = datetime(year, month, day, hour, minute, second)
-        timestamp = (timestamp - datetime(1970, 1, 1)).total_seconds()
-        timestamp += float(dt) / 1000
-        return timestamp
-
-    return 0
+    timestamp = file_time(filename, dt)
+    if timestamp is None:
+        return 0
+    return timestamp
 
 
 def parse_line_to_message(line):
@@ -0,0 +1,61 @@
+#!/usr/bin/env python
+
+import unittest
+
+
+from . import file_time
+
+
+class MainTest(unittest.TestCase):
+    def setUp(self):
+        file_time._cache.clear()
+
+    def test_parse_file_epoch(self):
+        self.assertEqual(file_time.parse_file_epoch('i-1443338945.6543-t1'), (1443338945.6543, None))
+        self.assertEqual(file_time.parse_file_epoch('i-1443338945-t1-o+12345'), (1443338945, None))
+        self.assertEqual(file_time.parse_file_epoch('i-1443338945-t1.ab'), (1443338945, 1))
+        self.assertEqual(file_time.parse_file_epoch('i-1443338945-r1.ba'), (1443338945, 26))
+        self.assertEqual(file_time.parse_file_epoch('10-26-2015T12-34-56-s1'), (1445862896, None))
+        self.assertEqual(file_time.parse_file_epoch('whatever'), (None, None))
+        self.assertEqual(file_time.parse_file_epoch('-'), (None, None))
+
+    def test_file_time(self):
+        self.assertEqual(file_time.file_time('i-1443338945.5-t1', 1500), 1443338947)
+        self.assertEqual(file_time.file_time('i-1443338945-t1.ab', '000001000'), 1443338945 + 1 + 600)
+        self.assertEqual(file_time.file_time('10-26-2015T12-34-56-s1', 250), 1445862896.25)
+        self.assertIsNone(file_time.file_time('whatever', 1000))
+
+    def test_cache(self):
+        calls = []
+        parse_file_epoch = file_time.parse_file_epoch
+
+        def counting_parse(filename):
+            calls.append(filename)
+            return parse_file_epoch(filename)
+
+        file_time.parse_file_epoch = counting_parse
+        try:
+            for _ in range(3):
+                file_time.file_epoch('i-1443338945-t1')
+            self.assertEqual(calls, ['i-1443338945-t1'])
+
+            for i in range(file_time.CACHE_SIZE + 1):
+                file_time.file_epoch('i-%d-t1' % i)
+            self.assertEqual(len(file_time._cache), file_time.CACHE_SIZE)
+            self.assertNotIn('i-1443338945-t1', file_time._cache)
+
+            # Using an entry keeps it in the cache
+            file_time.file_epoch('i-1-t1')
+            file_time.file_epoch('i-other-t1')
+            self.assertIn('i-1-t1', file_time._cache)
+            self.assertNotIn('i-2-t1', file_time._cache)
+        finally:
+            file_time.parse_file_epoch = parse_file_epoch
+
+
+def main():
+    unittest.main()
+
+
+if __name__ == "__main__":
+    main()
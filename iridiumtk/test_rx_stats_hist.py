@@ -3,10 +3,19 @@
 import unittest
 
 
+from .rx_stats_hist import extract_timestamp
+
+
 class MainTest(unittest.TestCase):
     def test_pass(self):
         pass
 
+    def test_extract_timestamp(self):
+        self.assertEqual(extract_timestamp('i-1443338945.5-t1', '0001500'), 1443338947)
+        self.assertEqual(extract_timestamp('i-1443338945-t1.ab', '0001000'), 1443338945 + 1 + 600)
+        self.assertEqual(extract_timestamp('10-26-2015T12-34-56-s1', '0000250'), 1445862896.25)
+        self.assertEqual(extract_timestamp('whatever', '0001000'), 0)
+
 
 def main():
     unittest.main()
@@ -12,6 +12,9 @@ import matplotlib.pyplot as plt
 import threading
 import time
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "extractor-python"))
+import samples
+
 def normalize(v):
     m = max(v)
     return [x/m for x in v]
@@ -22,10 +25,12 @@ class PeakHold(object):
         self._fft_size=self._slice_size
 
         if use_8bit:
-            self._struct_elem = numpy.uint8
+            self._converter = samples.SampleConverter('rtl', offset=127.35)
+            self._struct_elem = self._converter.element
             self._struct_len = numpy.dtype(self._struct_elem).itemsize * self._slice_size *2
         else:
-            self._struct_elem = numpy.complex64
+            self._converter = samples.SampleConverter('float')
+            self._struct_elem = self._converter.element
             self._struct_len = numpy.dtype(self._struct_elem).itemsize * self._slice_size
 
         self._window = numpy.blackman(self._fft_size)
@@ -42,6 +47,7 @@ class PeakHold(object):
 
 
     def process_file(self, file_name):
+        out = numpy.empty(self._slice_size, dtype=numpy.complex64)
         with open(file_name, "rb") as f:
             f.read(self._struct_len)
             while True:
@@ -49,12 +55,8 @@ class PeakHold(object):
                 if not data: break
                 if len(data) != self._struct_len: break
 
-                slice = numpy.frombuffer(data, dtype=self._struct_elem)
-                if self._struct_elem == numpy.uint8:
-                    slice = slice.astype(numpy.float32) # convert to float
-                    slice = (slice-127.35)/128.             # Normalize
-                    slice = slice.view(numpy.complex64) # reinterpret as complex
-                
+                slice = self._converter.convert(numpy.frombuffer(data, dtype=self._struct_elem), out)
+
                 spectrum = self._fft(slice, self._fft_size)
                 mag = spectrum
                 mag = numpy.abs(spectrum)**2
@@ -1,22 +1,26 @@
 #!/usr/bin/env python
 # vim: set ts=4 sw=4 tw=0 et pm=:
 import sys
+import os.path
 import numpy
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "extractor-python"))
+import samples
+
 class Converter(object):
     def __init__(self, verbose=False):
-        self._struct_elem = numpy.uint8
+        self._converter = samples.SampleConverter('rtl', offset=127.35, scale=10000)
+        self._struct_elem = self._converter.element
 
     def process_file(self, file_name):
+        out = numpy.empty(512, dtype=numpy.complex64)
         with open(file_name, "rb") as f:
             while True:
                 data = f.read(1024)
                 if not data: break
 
-                slice = numpy.frombuffer(data, dtype=self._struct_elem)
-                slice = slice.astype(numpy.float32) # convert to float
-                slice = (slice-127.35)/128.*10000             # Normalize
-                #slice = slice.view(numpy.complex64) # reinterpret as complex
+                slice = numpy.frombuffer(data, dtype=self._struct_elem, count=len(data)//2*2) # only whole I/Q pairs
+                slice = self._converter.convert(slice, out[:len(slice)//2])
                 slice.tofile(sys.stdout)
 
 if __name__ == "__main__":
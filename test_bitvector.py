@@ -0,0 +1,80 @@
+#!/usr/bin/env python
+# vim: set ts=4 sw=4 tw=0 et pm=:
+# python2 -m unittest test_bitvector
+
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import unittest
+
+from bitvector import Bits
+
+# IMS, unknown type, MS3, IRI, IMS
+RAW_LINES = [
+    "RAW: i-1443338945-t1.ab 0000006 1625489861 A:no L:no  95% 3.682 368 0011000000110000111100110011001111110011001100111111001100000000001101010101111100101101110101010000001011010000110000001011010110111011000110111110110010000001011110110011000010000000101100010001111011000011101100010100000001111000001010100101010000001100010010001100010110110111010111000011011001010100110001001100100100100100111101001101110010011100001111110010101101101010110100100001111100110001100001011010111100001010101101101100011111110100111011110001010111001110010110011101000010101000000111100001100001110101010111111001101001010100011001111010000000000101111100101000100110110101101010110011000110101110111000011110101111000000110101111100100011000100111110100111110000010110110001101100101000110010111111001011010100011000101101101101110010110111",
+    "RAW: i-1443338945.6543-t1 0000048 1626024891 A:OK L:no  60% 9.921 198 001100000011000011110011101110010100100111001101010110000100010011111101011010100100000011001111101000000001010111011100111001011000001100010000111101110110011101001010111110101100011010001001010100011011001000110101111111010001101001001011100010101111111011110111001100110110000100110011100011101101111111011011001101010001001111111111100011111011011011110110100000000010010111010101110001001010011111100101010010110110",
+    "RAW: 10-26-2015T12-34-56-s1 0000189 1626584345 A:no L:no  60% 6.632 272 <001100000011000011110011> 00110011111100110011001111110011 01110010100110001010010010011100 00111110001101011100100011000110 01000101101010101010101001000000 01101101110000010101001100010100 11111110011001010011111100000000 00110111110011000101000100000000 11010001000010111010100101010100 11001101000010000011000010101101 01011011101100111000010101111101 00110010010110011110001111100110 10011110001001001101111001000111 11000000001101110101110110110010 11110001000010010011100111111111 01001011111000001101011110010111 11011111011101011110101101010101 11010000001111010000100000010100",
+    "RAW: i-1443338945.6543-t1 0000312 1625596684 A:no L:no  60% 9.628  61 <110011000011110011111100> 01011111111100010110000111001000 00000100011000101111110011000000 01010100011111011101101000101010 01111000011010011110011000",
+    "RAW: i-1443338945-t1-o+12345 0000429 1625640144 A:OK L:no  80% 7.085 112 00110000001100001111001100110011111100110011001111110011010001000001100011101011001010010010110011001110100001001000111010111101101010001111110101111110000111010101111101100110011111111011011110011101010001111110110111000000011111100011111000011110",
+]
+
+class BitsTest(unittest.TestCase):
+    def test_string_methods(self):
+        rng = random.Random(1)
+        for _ in xrange(2000):
+            string = "".join(rng.choice("01") for _ in xrange(rng.randint(0, 40)))
+            bits = Bits.from_string(string)
+            sub = "".join(rng.choice("01") for _ in xrange(rng.randint(0, 5)))
+            self.assertEqual(sub in bits, sub in string)
+            self.assertEqual(Bits.from_string(sub) in bits, sub in string)
+            self.assertEqual(bits.find(sub), string.find(sub))
+            self.assertEqual(bits.find(Bits.from_string(sub), 3), string.find(sub, 3))
+            self.assertEqual(bits.find(sub, 2, -2), string.find(sub, 2, -2))
+            if sub in string:
+                self.assertEqual(bits.index(sub), string.index(sub))
+            else:
+                self.assertRaises(ValueError, bits.index, sub)
+            self.assertEqual(bits.startswith(sub), string.startswith(sub))
+            self.assertEqual(bits[3:9], string[3:9])
+            self.assertEqual(str(bits[::-1]), string[::-1])
+            self.assertEqual(len(bits), len(string))
+
+class FilterTest(unittest.TestCase):
+    """ --filter expressions written for the bits as strings """
+    @classmethod
+    def setUpClass(cls):
+        (fd, cls.input) = tempfile.mkstemp()
+        with os.fdopen(fd, "w") as f:
+            f.write("\n".join(RAW_LINES) + "\n")
+
+    @classmethod
+    def tearDownClass(cls):
+        os.unlink(cls.input)
+
+    def selected(self, expression):
+        parser = os.path.join(os.path.dirname(os.path.abspath(__file__)), "iridium-parser.py")
+        output = subprocess.check_output([sys.executable, parser, "--filter", expression, self.input])
+        return [int(line.split()[2]) for line in output.splitlines() if not line.startswith("Warning")]
+
+    def test_substring(self):
+        self.assertEqual(self.selected('All,"0011001111110011" in q.bitstream_raw'), [6, 189, 429])
+        self.assertEqual(self.selected('All,"1111111" in q.bitstream_raw'), [6, 48, 189, 312, 429])
+
+    def test_find(self):
+        self.assertEqual(self.selected('All,q.bitstream_raw.find("00000000")>=0'), [6, 48, 189])
+        self.assertEqual(self.selected('All,q.bitstream_raw.find("00000000")>100'), [48, 189])
+
+    def test_int(self):
+        self.assertEqual(self.selected('All,int(q.bitstream_raw[24:32],2)==51'), [6, 189, 429])
+        self.assertEqual(self.selected('All,int(q.bitstream_raw[24:32],2)>100'), [48, 312])
+
+    def test_fields(self):
+        self.assertEqual(self.selected('All,q.bitstream_raw[24:32]=="00110011"'), [6, 189, 429])
+        self.assertEqual(self.selected('All,len(q.bitstream_raw)>600'), [6])
+        self.assertEqual(self.selected('IridiumMSMessage,q.oddbits.startswith("1")'), [429])
+        self.assertEqual(self.selected('IridiumMSMessage,q.bitstream_messaging[0:4]=="0000"'), [6, 429])
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,47 @@
+#!/usr/bin/env python
+# vim: set ts=4 sw=4 tw=0 et pm=:
+# python2 -m unittest test_interleave
+
+import random
+import unittest
+
+import interleave
+from bitvector import Bits
+
+def permuted(positions, string):
+    return "".join(string[p] for p in positions)
+
+class InterleaverTest(unittest.TestCase):
+    def test_random_permutations(self):
+        rng = random.Random(1)
+        for size in range(0, 70) + [96, 128]:
+            positions = range(size)
+            rng.shuffle(positions)
+            interleaver = interleave.Interleaver(positions, (size,))
+            for _ in xrange(20):
+                string = "".join(rng.choice("01") for _ in xrange(size))
+                self.assertEqual(str(interleaver(Bits.from_string(string))[0]), permuted(positions, string))
+
+    def test_frame(self):
+        rng = random.Random(2)
+        # 64 bits: all blocks at once, 96 bits: block by block
+        for n, ways in ((64, 2), (96, 3), (46, 2)):
+            interleaver = interleave.symbols(n, ways)
+            for length in xrange(0, 5*n, 7):
+                string = "".join(rng.choice("01") for _ in xrange(length))
+                count = length // interleaver.size
+                expected = "".join(permuted(interleaver.positions, string[block*interleaver.size:(block+1)*interleaver.size]) for block in xrange(count))
+                output, rest = interleaver.frame(Bits.from_string(string))
+                self.assertEqual((str(output), str(rest)), (expected, string[count*interleaver.size:]))
+
+    def test_parts(self):
+        string = "".join("01"[(x * 7) % 3 % 2] for x in xrange(46))
+        parts = interleave.lcw(Bits.from_string(string))
+        self.assertEqual([len(part) for part in parts], [7, 13, 26])
+        self.assertEqual("".join(map(str, parts)), permuted(interleave.lcw.positions, string))
+
+    def test_no_permutation(self):
+        self.assertRaises(ValueError, interleave.Interleaver, [0, 0, 1], (3,))
+
+if __name__ == "__main__":
+    unittest.main()